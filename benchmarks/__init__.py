@@ -0,0 +1,11 @@
+"""
+Benchmarks for the Cursor chat extraction pipeline.
+
+Run a benchmark as a module from the repository root, e.g.:
+
+    python -m benchmarks.bench_decode
+    python -m benchmarks.bench_pipeline
+
+benchmarks.synthetic builds the fake Cursor roots they run on; point the
+server at one with CURSOR_LIVE_ROOT.
+"""
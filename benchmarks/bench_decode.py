@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON decoding of a synthetic global state.vscdb.
+
+Compares every installed backend (stdlib json, orjson, msgspec) on:
+  * decoding raw bubble / composerData blobs into the typed records, and
+  * a full scan_global_db() of the synthetic database.
+
+    python -m benchmarks.bench_decode --composers 200 --bubbles 50
+"""
+
+import argparse
+import logging
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+from benchmarks.synthetic import build_global_db  # noqa: E402
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def available_backends() -> list[str]:
+    names = ["json"]
+    if server.orjson is not None:
+        names.append("orjson")
+    if server.msgspec is not None:
+        names.append("msgspec")
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON decoding backends")
+    parser.add_argument("--composers", type=int, default=200, help="Number of composers to generate")
+    parser.add_argument("--bubbles", type=int, default=40, help="Bubbles per composer")
+    parser.add_argument("--text-size", type=int, default=600, help="Approximate characters of text per bubble")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = pathlib.Path(tmp) / "state.vscdb"
+        build_global_db(db, args.composers, args.bubbles, args.text_size)
+        con = sqlite3.connect(db)
+        bubble_blobs = [r[0] for r in con.execute("SELECT value FROM cursorDiskKV WHERE key LIKE 'bubbleId:%'")]
+        composer_blobs = [r[0] for r in con.execute("SELECT value FROM cursorDiskKV WHERE key LIKE 'composerData:%'")]
+        con.close()
+        total_mb = (sum(map(len, bubble_blobs)) + sum(map(len, composer_blobs))) / 1e6
+        print(f"Synthetic global DB: {len(bubble_blobs)} bubbles, {len(composer_blobs)} composers, "
+              f"{total_mb:.1f} MB of JSON\n")
+
+        def decode_all():
+            for raw in bubble_blobs:
+                server.decode_bubble(raw)
+            for raw in composer_blobs:
+                server.decode_composer(raw)
+
+        results = {}
+        for name in available_backends():
+            server.use_json_backend(name)
+            results[name] = (best_of(decode_all, args.repeat),
+                             best_of(lambda: server.scan_global_db(db), args.repeat))
+        server.use_json_backend()
+
+        base_decode, base_scan = results["json"]
+        print(f"{'backend':<10}{'decode (s)':>12}{'MB/s':>10}{'speedup':>10}{'scan (s)':>12}{'speedup':>10}")
+        for name, (decode_s, scan_s) in results.items():
+            print(f"{name:<10}{decode_s:>12.3f}{total_mb / decode_s:>10.0f}{base_decode / decode_s:>9.1f}x"
+                  f"{scan_s:>12.3f}{base_scan / scan_s:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Benchmark the extraction pipeline and the HTTP API on a synthetic Cursor root.
+
+Reports wall time (best of --repeat), peak RSS and throughput for:
+  * every registered extraction stage, over all workspace DBs or the global DB,
+  * merge_scans(), extract_chats() with an empty index, a warm index and
+    after one new bubble in the global DB, get_latest_session_id(),
+    format_chat_for_frontend() and generate_standalone_html(), and
+  * the main GET endpoints through Flask's test client.
+
+The "after one global write" case appends bubbles to the root's global DB.
+
+    python -m benchmarks.bench_pipeline --workspaces 20 --composers 10 --bubbles 40
+    python -m benchmarks.bench_pipeline --root /tmp/cursor-root   # a tree from benchmarks.synthetic
+"""
+
+import argparse
+import logging
+import os
+import pathlib
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+# psutil is optional; /proc or getrusage() are used without it
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+import server  # noqa: E402
+import sqlite_pool  # noqa: E402
+from benchmarks import synthetic  # noqa: E402
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, None where it cannot be read."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+class PeakRSS:
+    """
+    Samples the process RSS from a background thread while the block runs.
+
+    Where RSS cannot be sampled, `peak` falls back to the lifetime maximum
+    reported by getrusage().
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while True:
+            self.peak = max(self.peak, current_rss() or 0)
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self) -> "PeakRSS":
+        if current_rss() is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, current_rss() or 0)
+        else:
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # KiB on Linux, bytes on macOS
+            self.peak = maxrss if sys.platform == "darwin" else maxrss * 1024
+
+def measure(fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None) -> tuple[float, int]:
+    """Return (best wall time in seconds, peak RSS in bytes) over `repeat` runs of fn()."""
+    best = float("inf")
+    with PeakRSS() as rss:
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+    return best, rss.peak
+
+def reset_server_state(cache_root: pathlib.Path):
+    """Drop the process-wide index, session store and pooled connections; start from an empty cache dir."""
+    os.environ["CURSOR_LIVE_CACHE_DIR"] = tempfile.mkdtemp(dir=cache_root)
+    server._chat_index = None
+    server._session_store = None
+    server._search_index = None
+    sqlite_pool.clear()
+
+def scan_rows(scan: dict) -> int:
+    return sum(len(v) for v in scan.values() if isinstance(v, (list, dict)))
+
+class Report:
+    def __init__(self):
+        print(f"{'benchmark':<44}{'time (s)':>10}{'peak RSS (MB)':>15}{'throughput':>22}")
+
+    def add(self, name: str, seconds: float, peak_rss: int, items: int, unit: str):
+        rate = items / seconds if seconds > 0 else float("inf")
+        print(f"{name:<44}{seconds:>10.4f}{peak_rss / 1e6:>15.1f}{rate:>14,.0f} {unit:<7}")
+
+def bench_pipeline(report: Report, root: pathlib.Path, cache_root: pathlib.Path, repeat: int, sample: list[str]):
+    ws_dbs = [(ws_id, db) for ws_id, db in server.workspaces(root)]
+    global_db = server.global_storage_path(root)
+
+    # Each stage reads its own rows; scans are kept for the merge benchmark
+    ws_scans = [(ws_id, str(db), {}) for ws_id, db in ws_dbs]
+    global_scan: dict = {}
+    for stage in server.stages("workspace"):
+        scans = [stage.read(db) for _, db in ws_dbs]
+        rows = sum(scan_rows(s) for s in scans)
+        seconds, rss = measure(lambda: [stage.read(db) for _, db in ws_dbs], repeat)
+        report.add(f"stage {stage.name} ({len(ws_dbs)} DBs)", seconds, rss, rows, "rows/s")
+        for (_, _, merged), scan in zip(ws_scans, scans):
+            merged.update(scan)
+    if global_db is not None:
+        for stage in server.stages("global"):
+            scan = stage.read(global_db)
+            seconds, rss = measure(lambda: stage.read(global_db), repeat)
+            report.add(f"stage {stage.name}", seconds, rss, scan_rows(scan), "rows/s")
+            global_scan.update(scan)
+
+    chats = server.merge_scans(ws_scans, str(global_db) if global_db else None,
+                               global_scan if global_db else None)
+    messages = sum(len(c["messages"]) for c in chats)
+    seconds, rss = measure(lambda: server.merge_scans(ws_scans, str(global_db) if global_db else None,
+                                                      global_scan if global_db else None), repeat)
+    report.add("merge_scans", seconds, rss, messages, "msg/s")
+
+    seconds, rss = measure(server.extract_chats, repeat, setup=lambda: reset_server_state(cache_root))
+    report.add("extract_chats (empty index)", seconds, rss, messages, "msg/s")
+    # Invalidate so the sidecar lookup is timed, not the store's refresh interval
+    seconds, rss = measure(server.extract_chats, repeat, setup=lambda: server.session_store().invalidate())
+    report.add("extract_chats (warm index)", seconds, rss, messages, "msg/s")
+
+    if global_db is not None and sample:
+        rng = random.Random(0)
+
+        def write_bubble():
+            synthetic.append_bubble(global_db, sample[0], 200, rng)
+            server.session_store().invalidate()
+
+        seconds, rss = measure(server.extract_chats, repeat, setup=write_bubble)
+        report.add("extract_chats (after one global write)", seconds, rss, messages, "msg/s")
+
+    seconds, rss = measure(lambda: [server.get_latest_session_id(ws_id) for ws_id, _ in ws_dbs], repeat)
+    report.add(f"get_latest_session_id ({len(ws_dbs)} workspaces)", seconds, rss, len(ws_dbs), "calls/s")
+
+    seconds, rss = measure(lambda: [server.format_chat_for_frontend(c) for c in chats], repeat)
+    report.add(f"format_chat_for_frontend ({len(chats)} chats)", seconds, rss, len(chats), "chats/s")
+
+    sampled = [c for c in chats if c["session"]["composerId"] in set(sample)]
+    seconds, rss = measure(lambda: [server.generate_standalone_html(server.format_chat_for_frontend(c))
+                                    for c in sampled], repeat)
+    report.add(f"generate_standalone_html ({len(sampled)} chats)", seconds, rss, len(sampled), "chats/s")
+
+def bench_endpoints(report: Report, root: pathlib.Path, repeat: int, sample: list[str]):
+    ws_ids = [ws_id for ws_id, _ in server.workspaces(root)]
+    client = server.app.test_client()
+    cases = [
+        ("GET /api/chats", ["/api/chats"]),
+        ("GET /api/chats?summary=1", ["/api/chats?summary=1"]),
+        ("GET /api/chats?limit=50", ["/api/chats?limit=50"]),
+        ("GET /api/chat/<id>", [f"/api/chat/{cid}" for cid in sample]),
+        ("GET /api/chat/<id>/export?format=json", [f"/api/chat/{cid}/export?format=json" for cid in sample]),
+        ("GET /api/chat/<id>/export?format=html", [f"/api/chat/{cid}/export?format=html" for cid in sample]),
+        ("GET /api/latest-session", [f"/api/latest-session?workspace_id={w}" for w in ws_ids]),
+        ("GET /api/workspace/<id>/info", [f"/api/workspace/{w}/info" for w in ws_ids]),
+        ("GET /api/search?q=...", ["/api/search?q=word42", "/api/search?q=word1234"]),
+    ]
+    for name, urls in cases:
+        failed = []
+
+        def run():
+            for url in urls:
+                response = client.get(url)
+                response.get_data()
+                if response.status_code != 200:
+                    failed.append((url, response.status_code))
+
+        # The first call builds the indexes; time the steady state
+        run()
+        seconds, rss = measure(run, repeat)
+        report.add(f"{name} (x{len(urls)})", seconds, rss, len(urls), "req/s")
+        if failed:
+            print(f"  {len(failed)} non-200 responses, e.g. {failed[0]}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the extraction pipeline and HTTP endpoints")
+    parser.add_argument("--root", type=pathlib.Path,
+                        help="Existing Cursor root to benchmark (default: build a synthetic one)")
+    synthetic.add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is reported)")
+    parser.add_argument("--sample", type=int, default=20, help="Chats used by per-chat benchmarks")
+    parser.add_argument("--skip-endpoints", action="store_true", help="Only benchmark the pipeline")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        root = args.root
+        if root is None:
+            root = tmp / "cursor"
+            print(f"Synthetic Cursor root: {synthetic.describe(synthetic.build_from_args(root, args))}")
+        os.environ["CURSOR_LIVE_ROOT"] = str(root)
+        cache_root = tmp / "cache"
+        cache_root.mkdir()
+        reset_server_state(cache_root)
+        print(f"JSON backend: {server.JSON_BACKEND}\n")
+
+        chat_ids = [c["session"]["composerId"] for c in server.extract_chats()]
+        sample = random.Random(args.seed).sample(chat_ids, min(args.sample, len(chat_ids)))
+
+        report = Report()
+        bench_pipeline(report, root, cache_root, args.repeat, sample)
+        if not args.skip_endpoints:
+            bench_endpoints(report, root, args.repeat, sample)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Build a synthetic Cursor storage root for benchmarks.
+
+The tree uses the layout and tables the server reads:
+
+    <root>/User/workspaceStorage/<id>/state.vscdb   ItemTable: history.entries, composer.composerData
+    <root>/User/globalStorage/state.vscdb           cursorDiskKV: bubbleId:*, composerData:*
+
+Point the server at it with CURSOR_LIVE_ROOT:
+
+    python -m benchmarks.synthetic /tmp/cursor-root --workspaces 20 --composers 10 --bubbles 40
+    CURSOR_LIVE_ROOT=/tmp/cursor-root python server.py
+"""
+
+import argparse
+import json
+import math
+import pathlib
+import random
+import sqlite3
+import uuid
+from typing import Callable, Optional
+
+# How bubble text sizes are drawn around --text-size
+SIZE_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+# Spread of the lognormal distribution: most replies are short, a few are huge
+LOGNORMAL_SIGMA = 1.0
+
+def text_sizer(distribution: str, mean: int, rng: random.Random) -> Callable[[], int]:
+    """Return a function drawing bubble text sizes (characters) with the given mean."""
+    if distribution == "fixed":
+        return lambda: mean
+    if distribution == "uniform":
+        return lambda: rng.randint(0, 2 * mean)
+    if distribution == "lognormal":
+        mu = math.log(max(mean, 1)) - LOGNORMAL_SIGMA ** 2 / 2
+        return lambda: int(rng.lognormvariate(mu, LOGNORMAL_SIGMA))
+    raise ValueError(f"Unknown size distribution: {distribution}")
+
+def fake_text(rng: random.Random, size: int) -> str:
+    return " ".join("word%d" % rng.randint(0, 9999) for _ in range(max(size // 8, 1)))
+
+def fake_bubble(rng: random.Random, bubble_id: str, bubble_type: int, text_size: int) -> dict:
+    """A bubble shaped like the ones Cursor writes, including the fields we never read."""
+    text = fake_text(rng, text_size)
+    return {
+        "_v": 2,
+        "type": bubble_type,
+        "bubbleId": bubble_id,
+        "text": text,
+        "richText": json.dumps({"root": {"children": [{"type": "paragraph", "text": text}]}}),
+        "codeBlocks": [{"uri": f"file:///src/mod{i}.py", "content": "x = 1\n" * rng.randint(5, 60)}
+                       for i in range(rng.randint(0, 3))],
+        "context": {"fileSelections": [], "selections": [], "terminalSelections": [],
+                    "folderSelections": [], "selectedDocs": []},
+        "relevantFiles": [f"src/file{i}.py" for i in range(rng.randint(0, 8))],
+        "toolResults": [],
+        "timingInfo": {"clientStartTime": 1700000000000, "clientEndTime": 1700000005000},
+        "isAgentic": bool(rng.getrandbits(1)),
+    }
+
+def create_state_db(path: pathlib.Path) -> sqlite3.Connection:
+    """Create an empty state.vscdb with Cursor's two key/value tables."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE ItemTable (key TEXT UNIQUE ON CONFLICT REPLACE, value BLOB)")
+    con.execute("CREATE TABLE cursorDiskKV (key TEXT UNIQUE ON CONFLICT REPLACE, value BLOB)")
+    return con
+
+def new_id(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128)))
+
+def build_global_db(path: pathlib.Path, composers: int, bubbles: int, text_size: int, seed: int = 0,
+                    size_distribution: str = "fixed", composer_ids: Optional[list[str]] = None,
+                    inline_ratio: float = 0.0) -> int:
+    """
+    Write a cursorDiskKV-style global DB with `composers` x `bubbles` bubbles.
+
+    `composer_ids` fixes the composers to write (their count overrides
+    `composers`). A share `inline_ratio` of the composers also carry the full
+    `conversation` in their composerData, as older Cursor versions wrote it,
+    so the same messages arrive from two sources. Returns the bytes written.
+    """
+    rng = random.Random(seed)
+    sizer = text_sizer(size_distribution, text_size, rng)
+    if composer_ids is None:
+        composer_ids = [new_id(rng) for _ in range(composers)]
+    written = 0
+    con = create_state_db(path)
+    for cid in composer_ids:
+        headers = []
+        conversation = []
+        inline = rng.random() < inline_ratio
+        for b in range(bubbles):
+            bid = new_id(rng)
+            bubble = fake_bubble(rng, bid, 1 if b % 2 == 0 else 2, sizer())
+            headers.append({"bubbleId": bid, "type": bubble["type"]})
+            if inline:
+                conversation.append({"bubbleId": bid, "type": bubble["type"], "text": bubble["text"]})
+            value = json.dumps(bubble)
+            written += len(value)
+            con.execute("INSERT INTO cursorDiskKV VALUES (?,?)", (f"bubbleId:{cid}:{bid}", value))
+        composer = {"_v": 3, "composerId": cid, "createdAt": 1700000000000 + rng.randint(0, 10**9),
+                    "fullConversationHeadersOnly": headers, "conversation": conversation,
+                    "context": {"mentions": {}}, "status": "completed"}
+        value = json.dumps(composer)
+        written += len(value)
+        con.execute("INSERT INTO cursorDiskKV VALUES (?,?)", (f"composerData:{cid}", value))
+    con.commit()
+    con.close()
+    return written
+
+def append_bubble(path: pathlib.Path, composer_id: str, text_size: int, rng: random.Random) -> str:
+    """Write one new assistant bubble of `composer_id` to a global DB, as Cursor does while a chat runs."""
+    bid = new_id(rng)
+    con = sqlite3.connect(path)
+    try:
+        con.execute("INSERT OR REPLACE INTO cursorDiskKV VALUES (?,?)",
+                    (f"bubbleId:{composer_id}:{bid}", json.dumps(fake_bubble(rng, bid, 2, text_size))))
+        con.commit()
+    finally:
+        con.close()
+    return bid
+
+def build_workspace_db(path: pathlib.Path, project_root: str, composers: list[dict], rng: random.Random):
+    """Write a workspace state.vscdb: editor history under `project_root` and the composer list."""
+    con = create_state_db(path)
+    history = [{"editor": {"resource": f"file://{project_root}/src/module{i}.py"}}
+               for i in range(rng.randint(3, 30))]
+    con.execute("INSERT INTO ItemTable VALUES (?,?)", ("history.entries", json.dumps(history)))
+    con.execute("INSERT INTO ItemTable VALUES (?,?)",
+                ("composer.composerData", json.dumps({"allComposers": composers, "selectedComposerIds": []})))
+    con.execute("INSERT INTO ItemTable VALUES (?,?)", ("workbench.auxiliaryBar.hidden", "false"))
+    con.commit()
+    con.close()
+
+def build_cursor_root(root: pathlib.Path, workspaces: int = 10, composers: int = 10, bubbles: int = 40,
+                      text_size: int = 600, size_distribution: str = "lognormal",
+                      inline_ratio: float = 0.1, seed: int = 0) -> dict:
+    """
+    Build a Cursor root with `workspaces` workspaces of `composers` composers
+    of `bubbles` bubbles each, and return a summary of what was written.
+    """
+    rng = random.Random(seed)
+    composer_ids = []
+    for w in range(workspaces):
+        workspace_id = uuid.UUID(int=rng.getrandbits(128)).hex
+        metas = []
+        for k in range(composers):
+            cid = new_id(rng)
+            created = 1700000000000 + rng.randint(0, 10**10)
+            metas.append({"composerId": cid, "name": f"Chat {w}-{k}", "type": "head",
+                          "createdAt": created, "lastUpdatedAt": created + rng.randint(0, 10**7)})
+            composer_ids.append(cid)
+        build_workspace_db(root / "User" / "workspaceStorage" / workspace_id / "state.vscdb",
+                           f"/Users/dev/projects/project{w}", metas, rng)
+    written = build_global_db(root / "User" / "globalStorage" / "state.vscdb", len(composer_ids), bubbles,
+                              text_size, seed=seed, size_distribution=size_distribution,
+                              composer_ids=composer_ids, inline_ratio=inline_ratio)
+    return {"workspaces": workspaces, "composers": len(composer_ids),
+            "bubbles": len(composer_ids) * bubbles, "bytes": written}
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Generator options shared by the benchmarks that build a root."""
+    parser.add_argument("--workspaces", type=int, default=10, help="Number of workspaces")
+    parser.add_argument("--composers", type=int, default=10, help="Composers per workspace")
+    parser.add_argument("--bubbles", type=int, default=40, help="Bubbles per composer")
+    parser.add_argument("--text-size", type=int, default=600, help="Mean characters of text per bubble")
+    parser.add_argument("--size-distribution", choices=SIZE_DISTRIBUTIONS, default="lognormal",
+                        help="Distribution of bubble text sizes")
+    parser.add_argument("--inline-ratio", type=float, default=0.1,
+                        help="Share of composers that also store the full conversation inline")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+def build_from_args(root: pathlib.Path, args: argparse.Namespace) -> dict:
+    return build_cursor_root(root, args.workspaces, args.composers, args.bubbles, args.text_size,
+                             args.size_distribution, args.inline_ratio, args.seed)
+
+def describe(summary: dict) -> str:
+    return (f"{summary['workspaces']} workspaces, {summary['composers']} composers, "
+            f"{summary['bubbles']} bubbles, {summary['bytes'] / 1e6:.1f} MB of JSON")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a synthetic Cursor storage root")
+    parser.add_argument("root", type=pathlib.Path, help="Directory to create")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.root.exists() and any(args.root.iterdir()):
+        parser.error(f"{args.root} exists and is not empty")
+    summary = build_from_args(args.root, args)
+    print(f"Built {args.root}: {describe(summary)}")
+    print(f"Run the server on it with CURSOR_LIVE_ROOT={args.root}")
+
+if __name__ == "__main__":
+    main()
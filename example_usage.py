@@ -8,31 +8,43 @@ import requests
 import json
 import time
 
+BASE_URL = "http://127.0.0.1:5004"
+
+def post_job(url: str, data: dict):
+    """调用自动化接口：接口返回202和任务ID，轮询 /api/jobs/<id> 直到任务完成，返回 (状态码, 结果)"""
+    response = requests.post(url, json=data)
+    if response.status_code != 202:
+        return response.status_code, response.text
+
+    job = response.json()
+    while job["status"] in ("queued", "running"):
+        job = requests.get(f"{BASE_URL}/api/jobs/{job['job_id']}", params={"wait": 25}).json()
+    return job["status_code"], job["result"]
+
 def create_new_chat(workspace_id: str, root_path: str = None):
     """创建新对话"""
     print("🔄 创建新对话...")
 
-    url = "http://127.0.0.1:5004/api/create-new-chat"
+    url = f"{BASE_URL}/api/create-new-chat"
     data = {"workspace_id": workspace_id}
 
     if root_path:
         data["rootPath"] = root_path
 
-    response = requests.post(url, json=data)
+    status_code, result = post_job(url, data)
 
-    if response.status_code == 200:
-        result = response.json()
+    if status_code == 200:
         print(f"✅ 新对话创建成功: {result}")
         return result
     else:
-        print(f"❌ 创建失败: {response.status_code} - {response.text}")
+        print(f"❌ 创建失败: {status_code} - {result}")
         return None
 
 def send_message(workspace_id: str, message: str, session_id: str = None):
     """发送消息"""
     print(f"📤 发送消息: {message}")
 
-    url = "http://127.0.0.1:5004/api/send-message"
+    url = f"{BASE_URL}/api/send-message"
     data = {
         "workspace_id": workspace_id,
         "message": message
@@ -41,14 +53,13 @@ def send_message(workspace_id: str, message: str, session_id: str = None):
     if session_id:
         data["session_id"] = session_id
 
-    response = requests.post(url, json=data)
+    status_code, result = post_job(url, data)
 
-    if response.status_code == 200:
-        result = response.json()
+    if status_code == 200:
         print(f"✅ 消息发送成功: {result}")
         return result
     else:
-        print(f"❌ 发送失败: {response.status_code} - {response.text}")
+        print(f"❌ 发送失败: {status_code} - {result}")
         return None
 
 def main():
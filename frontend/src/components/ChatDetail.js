@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import axios from 'axios';
+import { postJob } from '../jobs';
 import ReactMarkdown from 'react-markdown';
 import {
   Container,
@@ -413,6 +414,27 @@ const ChatDetail = () => {
     };
   }, [sessionId, isNewChat, fetchChat, startRefreshTimer, startStatusTimer, checkCursorStatus]);
 
+  // 订阅会话消息流：有新消息或消息更新时立即刷新，定时刷新保留作为兜底
+  const fetchChatRef = useRef(fetchChat);
+  fetchChatRef.current = fetchChat;
+
+  useEffect(() => {
+    if (isNewChat || sessionId === 'new' || !sessionId || sessionId === 'undefined' || typeof EventSource === 'undefined') {
+      return undefined;
+    }
+
+    const source = new EventSource(`/api/chat/${sessionId}/stream?snapshot=0`);
+    const handleMessage = () => {
+      fetchChatRef.current();
+    };
+    source.addEventListener('message', handleMessage);
+    source.addEventListener('message_updated', handleMessage);
+
+    return () => {
+      source.close();
+    };
+  }, [sessionId, isNewChat]);
+
   // 当刷新间隔改变时，重启定时器
   useEffect(() => {
     if (refreshInterval) {
@@ -555,7 +577,7 @@ const ChatDetail = () => {
           payload.session_id = chat.session.composerId;
         }
 
-        const response = await axios.post('/api/send-message', payload);
+        const response = await postJob('/api/send-message', payload);
 
         // 检查响应
         if (response.data.success) {
@@ -639,7 +661,7 @@ const ChatDetail = () => {
       }
 
       // 直接发送消息到当前对话
-      const messageResponse = await axios.post('/api/send-message', {
+      const messageResponse = await postJob('/api/send-message', {
         message: inputText.trim(),
         workspace_id: currentWorkspaceId
       });
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import { postJob } from '../jobs';
 import {
   Container,
   Typography,
@@ -65,6 +66,8 @@ const ChatList = () => {
   const [showDemoChats, setShowDemoChats] = useState(false);
   const [expandedProjects, setExpandedProjects] = useState({});
   const [searchQuery, setSearchQuery] = useState('');
+  // Sessions whose message content matches searchQuery, from /api/search
+  const [contentMatchIds, setContentMatchIds] = useState(new Set());
   const [exportModalOpen, setExportModalOpen] = useState(false);
   const [dontShowExportWarning, setDontShowExportWarning] = useState(false);
   const [currentExportSession, setCurrentExportSession] = useState(null);
@@ -73,7 +76,8 @@ const ChatList = () => {
   const fetchChats = async () => {
     setLoading(true);
     try {
-      const response = await axios.get('/api/chats');
+      // Summary mode: titles, counts and previews only; bodies load in ChatDetail
+      const response = await axios.get('/api/chats', { params: { summary: 1 } });
       const chatData = response.data;
       
       // Check if these are sample chats (demo data)
@@ -151,6 +155,46 @@ const ChatList = () => {
     fetchChats();
   }, [showDemoChats]);
 
+  // Summaries carry no message bodies: match content through the server's search index
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query) {
+      setContentMatchIds(new Set());
+      return undefined;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get('/api/search', { params: { q: query, limit: 200 } });
+        if (!cancelled) {
+          setContentMatchIds(new Set(response.data.results.map(hit => hit.session_id)));
+        }
+      } catch (err) {
+        console.error('Content search failed:', err);
+        if (!cancelled) {
+          setContentMatchIds(new Set());
+        }
+      }
+    }, 300);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery]);
+
+  // Listing entries are summaries (message_count/preview); demo chats still carry messages
+  const getMessageCount = (chat) => (
+    typeof chat.message_count === 'number'
+      ? chat.message_count
+      : (Array.isArray(chat.messages) ? chat.messages.length : 0)
+  );
+
+  const getPreview = (chat) => (
+    chat.preview !== undefined
+      ? chat.preview
+      : (Array.isArray(chat.messages) && chat.messages[0] ? chat.messages[0].content : null)
+  );
+
   const toggleProjectExpand = (projectName) => {
     setExpandedProjects(prev => ({
       ...prev,
@@ -189,10 +233,16 @@ const ChatList = () => {
       // Check if project name matches
       const projectMatches = projectName.toLowerCase().includes(query);
       
-      // Check if any message content matches
-      const contentMatches = Array.isArray(chat.messages) && chat.messages.some(msg => 
-        typeof msg.content === 'string' && msg.content.toLowerCase().includes(query)
-      );
+      // Check if any message content matches: demo chats carry their messages,
+      // summaries are matched on title/preview here and on content by /api/search
+      const contentMatches = Array.isArray(chat.messages)
+        ? chat.messages.some(msg =>
+            typeof msg.content === 'string' && msg.content.toLowerCase().includes(query)
+          )
+        : contentMatchIds.has(chat.session_id) ||
+          [chat.title, chat.preview].some(text =>
+            typeof text === 'string' && text.toLowerCase().includes(query)
+          );
       
       if (projectMatches || contentMatches) {
         if (!acc[projectName]) {
@@ -348,7 +398,7 @@ const ChatList = () => {
       console.log('Creating new chat for workspace:', chat?.workspace_id);
 
       // 调用新的create-new-chat接口
-      const response = await axios.post('/api/create-new-chat', {
+      const response = await postJob('/api/create-new-chat', {
         workspace_id: chat?.workspace_id,
         rootPath: chat.project?.rootPath
       });
@@ -405,7 +455,7 @@ const ChatList = () => {
       }
 
       // 调用新的create-new-chat接口
-      const response = await axios.post('/api/create-new-chat', {
+      const response = await postJob('/api/create-new-chat', {
         workspace_id: firstChat.workspace_id,
         rootPath: projectData.path
       });
@@ -801,7 +851,7 @@ const ChatList = () => {
                             <Box sx={{ display: 'flex', alignItems: 'center', mb: 1.5 }}>
                               <MessageIcon fontSize="small" sx={{ mr: 1, color: safeColors.text.secondary }} />
                               <Typography variant="body2" fontWeight="500">
-                                {Array.isArray(chat.messages) ? chat.messages.length : 0} messages
+                                {getMessageCount(chat)} messages
                               </Typography>
                             </Box>
                             
@@ -821,7 +871,7 @@ const ChatList = () => {
                               </Typography>
                             )}
                             
-                            {Array.isArray(chat.messages) && chat.messages[0] && chat.messages[0].content && (
+                            {getPreview(chat) && (
                               <Box sx={{ 
                                 mt: 2, 
                                 p: 1.5, 
@@ -842,8 +892,8 @@ const ChatList = () => {
                                     fontWeight: 400
                                   }}
                                 >
-                                  {typeof chat.messages[0].content === 'string' 
-                                    ? chat.messages[0].content.substring(0, 100) + (chat.messages[0].content.length > 100 ? '...' : '')
+                                  {typeof getPreview(chat) === 'string'
+                                    ? getPreview(chat).substring(0, 100) + (getPreview(chat).length > 100 ? '...' : '')
                                     : 'Content unavailable'}
                                 </Typography>
                               </Box>
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import axios from 'axios';
+import { postJob } from '../jobs';
 import ReactMarkdown from 'react-markdown';
 import {
   Container,
@@ -153,7 +154,7 @@ const NewChat = () => {
       if (cursorStatus.isActive) {
         // 如果Cursor已激活，尝试关闭
         console.log('尝试关闭Cursor...');
-        const response = await axios.post('/api/cursor/quit');
+        const response = await postJob('/api/cursor/quit');
         
         if (response.data.success) {
           console.log('Cursor关闭成功');
@@ -164,7 +165,7 @@ const NewChat = () => {
       } else {
         // 如果Cursor未激活，尝试打开
         console.log('尝试打开Cursor...');
-        const response = await axios.post('/api/cursor/open', {
+        const response = await postJob('/api/cursor/open', {
           workspace_id: workspaceId
         });
         
@@ -198,7 +199,7 @@ const NewChat = () => {
       setInputText('');
       
       // 发送消息到后端
-      const response = await axios.post('/api/send-message', {
+      const response = await postJob('/api/send-message', {
         message: userMessage.content,
         workspace_id: workspaceId
       });
@@ -0,0 +1,40 @@
+import axios from 'axios';
+
+// 每次轮询最多在服务端等待的秒数；等待期间会占用一个请求线程，所以保持很短
+const POLL_WAIT_SECONDS = 1;
+// 两次轮询之间的间隔（毫秒），从最小值开始逐次翻倍到最大值
+const POLL_DELAY_MIN_MS = 250;
+const POLL_DELAY_MAX_MS = 2000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+/**
+ * 调用自动化接口（新建对话、发送消息、打开/退出Cursor）
+ * 这些接口以任务方式执行：立即返回202和任务ID，这里轮询 /api/jobs/<id> 直到任务完成。
+ * 轮询只在服务端短暂等待，并在两次轮询之间退避；脚本等可以通过 options.wait 请求更长的等待。
+ * 返回值与同步接口相同（{ status, data }）；任务失败时与axios一样抛出带 response 的错误。
+ */
+export async function postJob(url, data, { wait = POLL_WAIT_SECONDS } = {}) {
+  const response = await axios.post(url, data);
+  if (response.status !== 202) {
+    return response;
+  }
+
+  let job = response.data;
+  let delay = POLL_DELAY_MIN_MS;
+  while (job.status === 'queued' || job.status === 'running') {
+    const poll = await axios.get(`/api/jobs/${job.job_id}`, { params: { wait } });
+    job = poll.data;
+    if (job.status === 'queued' || job.status === 'running') {
+      await sleep(delay);
+      delay = Math.min(delay * 2, POLL_DELAY_MAX_MS);
+    }
+  }
+
+  if (job.status_code >= 400) {
+    const error = new Error(job.result?.error || `Request failed with status code ${job.status_code}`);
+    error.response = { status: job.status_code, data: job.result };
+    throw error;
+  }
+  return { status: job.status_code, data: job.result };
+}
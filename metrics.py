@@ -0,0 +1,241 @@
+"""
+In-process counters and timers, exported in the Prometheus text format.
+
+Metrics are module-level and cheap to update from any thread. timed()
+observes a duration into a histogram and also adds it to the phases of the
+request being served (if any), which the server can return as a
+`Server-Timing` header. Work handed to other threads keeps counting towards
+the request when it runs in a copy of the caller's context
+(contextvars.copy_context().run).
+
+Set CURSOR_LIVE_METRICS=0 to turn all recording off.
+"""
+import abc
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+ENABLED = os.environ.get("CURSOR_LIVE_METRICS", "1").lower() not in ("0", "false", "no")
+
+# Histogram buckets in seconds, from a pooled SQLite query to a cold full scan
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(abc.ABC):
+    """A named metric with one value per combination of label values."""
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> list[str]:
+        """Sample lines of the text format, one per value."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A monotonically increasing count."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(Metric):
+    """Observed values (durations) bucketed by upper bound, with their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [per-bucket counts..., +Inf count], sum
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            entry[1] += value
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, (list(entry[0]), entry[1])) for key, entry in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+_registry: Dict[str, Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name: str, help: str, labelnames: Iterable[str], **kwargs) -> Metric:
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help, labelnames, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+        return metric
+
+
+def counter(name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+    """Return the counter called `name`, registering it on first use."""
+    return _register(Counter, name, help, labelnames)
+
+
+def histogram(name: str, help: str, labelnames: Iterable[str] = (),
+              buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    """Return the histogram called `name`, registering it on first use."""
+    return _register(Histogram, name, help, labelnames, buckets=buckets)
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    return "\n".join(m.render() for m in metrics) + "\n"
+
+
+# --- per-request phases ---------------------------------------------------------
+class RequestTimings:
+    """Time spent per phase while serving one request; shared with worker threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases: Dict[str, list] = {}
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            entry = self.phases.setdefault(phase, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """Value for a Server-Timing header (durations in milliseconds)."""
+        with self._lock:
+            phases = sorted(self.phases.items(), key=lambda item: -item[1][0])
+        parts = [f'{phase};dur={seconds * 1000:.2f};desc="x{count}"' if count > 1
+                 else f"{phase};dur={seconds * 1000:.2f}"
+                 for phase, (seconds, count) in phases]
+        if total is not None:
+            parts.insert(0, f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "cursor_live_request_timings", default=None)
+
+
+def start_request() -> contextvars.Token:
+    """Start collecting phases for the request served by this context."""
+    return _current.set(RequestTimings() if ENABLED else None)
+
+
+def finish_request(token: contextvars.Token):
+    _current.reset(token)
+
+
+def current_request() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+CACHE_REQUESTS = counter("cursor_live_cache_requests_total",
+                         "Cache lookups, by cache and whether they hit", ("cache", "result"))
+
+
+def cache_lookup(cache: str, hit: bool):
+    """Count one lookup of `cache`."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+PHASE_SECONDS = histogram("cursor_live_phase_duration_seconds",
+                          "Time spent in each phase of extraction and response building",
+                          ("phase",))
+
+
+def record(phase: str, seconds: float):
+    """Count `seconds` towards `phase`, globally and for the current request."""
+    if not ENABLED:
+        return
+    PHASE_SECONDS.observe(seconds, phase=phase)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextlib.contextmanager
+def timed(phase: str):
+    """Time the block as one observation of `phase`."""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - start)
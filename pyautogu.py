@@ -266,6 +266,7 @@ class CursorAutomation:
                 import sys
                 import os
                 import sqlite3
+                import sqlite_pool
                 import json
                 import pathlib
                 import platform
@@ -304,7 +305,7 @@ class CursorAutomation:
                     # 连接数据库并查询侧边栏状态
                     con = None
                     try:
-                        con = sqlite3.connect(f"file:{workspace_db}?mode=ro", uri=True)
+                        con = sqlite_pool.connect(workspace_db)
                         cur = con.cursor()
                         
                         # 查询workbench.auxiliaryBar.hidden的值
@@ -5,16 +5,30 @@ Simple API server to serve Cursor chat data for the web interface.
 
 import json
 import uuid
+import base64
+import bisect
+import hashlib
 import logging
 import datetime
 import time
 import os
 import platform
 import sqlite3
+import sqlite_pool
+import metrics
 import argparse
+import contextvars
 import pathlib
+import queue
+import threading
+import sys
 import traceback
+import functools
+import zlib
+from collections import OrderedDict
 from collections import defaultdict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Iterable, Optional
 from pathlib import Path
 from flask import Flask, Response, jsonify, send_from_directory, request
@@ -35,6 +49,10 @@ current_workspace_id = None
 # Cursor storage roots
 ################################################################################
 def cursor_root() -> pathlib.Path:
+    # Point the server at another tree, e.g. one built by benchmarks.synthetic
+    override = os.environ.get("CURSOR_LIVE_ROOT")
+    if override:
+        return pathlib.Path(override).expanduser()
     h = pathlib.Path.home()
     s = platform.system()
     if s == "Darwin":   return h / "Library" / "Application Support" / "Cursor"
@@ -42,59 +60,252 @@ def cursor_root() -> pathlib.Path:
     if s == "Linux":    return h / ".config" / "Cursor"
     raise RuntimeError(f"Unsupported OS: {s}")
 
+################################################################################
+# JSON decoding
+################################################################################
+# msgspec / orjson are optional; stdlib json is always available as a fallback.
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if msgspec is not None:
+    class ConversationEntry(msgspec.Struct, rename="camel"):
+        """One entry of a composerData `conversation`."""
+        type: Any = None
+        text: Any = None
+        bubble_id: Any = None
+
+    class BubbleRecord(msgspec.Struct, rename="camel"):
+        """The bubble fields the pipeline uses; all other fields are skipped while decoding."""
+        type: Any = None
+        text: Any = None
+        rich_text: Any = None
+
+    class ComposerRecord(msgspec.Struct, rename="camel"):
+        """The composerData fields the pipeline uses."""
+        created_at: Any = None
+        conversation: Optional[list[ConversationEntry]] = None
+else:
+    class ConversationEntry:
+        """One entry of a composerData `conversation`."""
+        __slots__ = ("type", "text", "bubble_id")
+
+        def __init__(self, type=None, text=None, bubble_id=None):
+            self.type = type
+            self.text = text
+            self.bubble_id = bubble_id
+
+    class BubbleRecord:
+        """The bubble fields the pipeline uses."""
+        __slots__ = ("type", "text", "rich_text")
+
+        def __init__(self, type=None, text=None, rich_text=None):
+            self.type = type
+            self.text = text
+            self.rich_text = rich_text
+
+    class ComposerRecord:
+        """The composerData fields the pipeline uses."""
+        __slots__ = ("created_at", "conversation")
+
+        def __init__(self, created_at=None, conversation=None):
+            self.created_at = created_at
+            self.conversation = conversation
+
+JSON_BACKEND = "json"
+json_loads = json.loads
+_bubble_decoder = None
+_composer_decoder = None
+
+def use_json_backend(name: Optional[str] = None) -> str:
+    """
+    Select the JSON decoder: "msgspec", "orjson" or "json".
+
+    Without a name the fastest installed backend is used. msgspec decodes
+    bubbles and composerData straight into the typed records above.
+    """
+    global JSON_BACKEND, json_loads, _bubble_decoder, _composer_decoder
+    if name is None:
+        name = "msgspec" if msgspec is not None else "orjson" if orjson is not None else "json"
+    if name == "msgspec" and msgspec is not None:
+        json_loads = msgspec.json.decode
+        _bubble_decoder = msgspec.json.Decoder(BubbleRecord)
+        _composer_decoder = msgspec.json.Decoder(ComposerRecord)
+    elif name == "orjson" and orjson is not None:
+        json_loads = orjson.loads
+        _bubble_decoder = _composer_decoder = None
+    else:
+        name = "json"
+        json_loads = json.loads
+        _bubble_decoder = _composer_decoder = None
+    JSON_BACKEND = name
+    return name
+
+use_json_backend(os.environ.get("CURSOR_LIVE_JSON") or None)
+
+def _typed_decode(decoder, raw):
+    if decoder is not None:
+        try:
+            return decoder.decode(raw)
+        except msgspec.ValidationError:
+            pass  # unexpected field types: fall back to the generic path
+    d = json_loads(raw)
+    if not isinstance(d, dict):
+        raise ValueError("expected a JSON object")
+    return d
+
+def decode_bubble(raw) -> BubbleRecord:
+    """Decode a cursorDiskKV bubble value into a BubbleRecord."""
+    b = _typed_decode(_bubble_decoder, raw)
+    if isinstance(b, BubbleRecord):
+        return b
+    return BubbleRecord(type=b.get("type"), text=b.get("text"), rich_text=b.get("richText"))
+
+def decode_composer(raw) -> ComposerRecord:
+    """Decode a cursorDiskKV composerData value into a ComposerRecord."""
+    c = _typed_decode(_composer_decoder, raw)
+    if isinstance(c, ComposerRecord):
+        return c
+    conversation = c.get("conversation")
+    if isinstance(conversation, list):
+        conversation = [ConversationEntry(type=m.get("type"), text=m.get("text"), bubble_id=m.get("bubbleId"))
+                        for m in conversation if isinstance(m, dict)]
+    else:
+        conversation = None
+    return ComposerRecord(created_at=c.get("createdAt"), conversation=conversation)
+
 ################################################################################
 # Helpers
 ################################################################################
+ROWS_READ = metrics.counter("cursor_live_rows_read_total",
+                            "Key/value rows read from Cursor's databases, by table and key", ("source",))
+BYTES_READ = metrics.counter("cursor_live_bytes_read_total",
+                             "Value bytes read from Cursor's databases, by table and key", ("source",))
+
+def count_read(source: str, values: Iterable[Any]):
+    """Add rows and value bytes read from `source` to the counters."""
+    if not metrics.ENABLED:
+        return
+    rows = size = 0
+    for v in values:
+        rows += 1
+        if v is not None:
+            size += len(v)
+    ROWS_READ.inc(rows, source=source)
+    BYTES_READ.inc(size, source=source)
+
 def j(cur: sqlite3.Cursor, table: str, key: str):
-    cur.execute(f"SELECT value FROM {table} WHERE key=?", (key,))
-    row = cur.fetchone()
+    with metrics.timed("sqlite.query"):
+        cur.execute(f"SELECT value FROM {table} WHERE key=?", (key,))
+        row = cur.fetchone()
     if row:
-        try:    return json.loads(row[0])
+        count_read(f"{table}:{key}", (row[0],))
+        try:
+            with metrics.timed("decode"):
+                return json_loads(row[0])
         except Exception as e: 
             logger.debug(f"Failed to parse JSON for {key}: {e}")
     return None
 
-def iter_bubbles_from_disk_kv(db: pathlib.Path) -> Iterable[tuple[str,str,str,str]]:
-    """Yield (composerId, role, text, db_path) from cursorDiskKV table."""
+def normalize_timestamp(value) -> Optional[int]:
+    """
+    Normalize a Cursor timestamp to integer milliseconds since the epoch.
+
+    Cursor stores ms ints, but older entries carry numeric or ISO-8601 strings,
+    seconds, or nothing at all. Anything unparseable becomes None.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        try:
+            value = float(value)
+        except ValueError:
+            try:
+                value = datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000
+            except ValueError:
+                return None
+    if not isinstance(value, (int, float)) or value != value or value <= 0:
+        return None
+    # Values this small are seconds, not milliseconds
+    if value < 1e11:
+        value *= 1000
+    return int(value)
+
+# Rows pulled per fetchmany() call when streaming large tables
+FETCH_BATCH_SIZE = 256
+
+def key_range(prefix: str) -> tuple[str, str]:
+    """Return (lo, hi) so that `lo <= key < hi` matches exactly the keys starting with `prefix`."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def iter_disk_kv(db: pathlib.Path, prefix: str, rowids: bool = False) -> Iterable[tuple]:
+    """
+    Yield (key, value) from cursorDiskKV for every key starting with `prefix`.
+
+    Uses a primary-key range instead of LIKE so SQLite walks the key index and
+    streams rows in key order, one batch of blobs at a time. With `rowids`,
+    yields (rowid, key, value) so callers that need the order Cursor wrote
+    the rows in (e.g. bubbles of a conversation) can restore it.
+    """
+    con = None
     try:
-        con = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+        con = sqlite_pool.connect(db)
         cur = con.cursor()
         # Check if table exists
         cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='cursorDiskKV'")
         if not cur.fetchone():
-            con.close()
             return
-        
-        cur.execute("SELECT key, value FROM cursorDiskKV WHERE key LIKE 'bubbleId:%'")
+        source = "cursorDiskKV:" + prefix.split(":", 1)[0]
+        columns = "rowid, key, value" if rowids else "key, value"
+        with metrics.timed("sqlite.query"):
+            cur.execute(f"SELECT {columns} FROM cursorDiskKV WHERE key >= ? AND key < ?",
+                        key_range(prefix))
+        while True:
+            with metrics.timed("sqlite.query"):
+                rows = cur.fetchmany(FETCH_BATCH_SIZE)
+            if not rows:
+                return
+            count_read(source, (r[-1] for r in rows))
+            yield from rows
     except sqlite3.DatabaseError as e:
+        # Lock contention is retried by the caller instead of dropping the rows
+        if sqlite_pool.is_contention(e):
+            raise
         logger.debug(f"Database error with {db}: {e}")
-        return
-    
-    db_path_str = str(db)
-    
-    for k, v in cur.fetchall():
-        try:
-            if v is None:
-                continue
-                
-            b = json.loads(v)
-        except Exception as e:
-            logger.debug(f"Failed to parse bubble JSON for key {k}: {e}")
-            continue
-        
-        txt = (b.get("text") or b.get("richText") or "").strip()
-        if not txt:         continue
-        role = "user" if b.get("type") == 1 else "assistant"
-        composerId = k.split(":")[1]  # Format is bubbleId:composerId:bubbleId
-        yield composerId, role, txt, db_path_str
+    finally:
+        if con is not None:
+            con.close()
+
+def bubble_message(k: str, v: Any) -> Optional[tuple[str, str, str, str]]:
+    """Decode one bubble row into (composerId, bubbleId, role, text); None if it carries no text."""
+    try:
+        if v is None:
+            return None
+            
+        b = decode_bubble(v)
+    except Exception as e:
+        logger.debug(f"Failed to parse bubble JSON for key {k}: {e}")
+        return None
     
-    con.close()
+    txt = b.text or b.rich_text or ""
+    if not isinstance(txt, str): return None
+    txt = txt.strip()
+    if not txt:         return None
+    role = "user" if b.type == 1 else "assistant"
+    parts = k.split(":")  # Format is bubbleId:composerId:bubbleId
+    return parts[1], parts[2] if len(parts) > 2 else "", role, txt
 
 def iter_chat_from_item_table(db: pathlib.Path) -> Iterable[tuple[str,str,str,str]]:
     """Yield (composerId, role, text, db_path) from ItemTable."""
     con = None
     try:
-        con = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+        con = sqlite_pool.connect(db)
         cur = con.cursor()
         
         # Try to get chat data from workbench.panel.aichat.view.aichat.chatdata
@@ -136,18 +347,22 @@ def iter_chat_from_item_table(db: pathlib.Path) -> Iterable[tuple[str,str,str,st
                 cur.execute("SELECT key, value FROM ItemTable WHERE key LIKE ?", (f"{key_prefix}%",))
                 for k, v in cur.fetchall():
                     try:
-                        data = json.loads(v)
+                        data = json_loads(v)
                         if isinstance(data, list):
                             for item in data:
                                 if "id" in item and "text" in item:
                                     role = "user" if "prompts" in key_prefix else "assistant"
                                     yield item.get("id", "unknown"), role, item.get("text", ""), str(db)
-                    except json.JSONDecodeError:
+                    except ValueError:
                         continue
-            except sqlite3.Error:
+            except sqlite3.Error as e:
+                if sqlite_pool.is_contention(e):
+                    raise
                 continue
     
     except sqlite3.DatabaseError as e:
+        if sqlite_pool.is_contention(e):
+            raise
         logger.debug(f"Database error in ItemTable with {db}: {e}")
         return
     finally:
@@ -157,39 +372,135 @@ def iter_chat_from_item_table(db: pathlib.Path) -> Iterable[tuple[str,str,str,st
             except Exception:
                 pass
 
-def iter_composer_data(db: pathlib.Path) -> Iterable[tuple[str,dict,str]]:
-    """Yield (composerId, composerData, db_path) from cursorDiskKV table."""
-    con = None
-    try:
-        con = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
-        cur = con.cursor()
-        # Check if table exists
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='cursorDiskKV'")
-        if not cur.fetchone():
-            con.close()
-            return
-        
-        cur.execute("SELECT key, value FROM cursorDiskKV WHERE key LIKE 'composerData:%'")
-    except sqlite3.DatabaseError as e:
-        logger.debug(f"Database error with {db}: {e}")
-        return
-    
+def iter_composer_data(db: pathlib.Path) -> Iterable[tuple[str,ComposerRecord,str]]:
+    """Yield (composerId, ComposerRecord, db_path) from cursorDiskKV table."""
     db_path_str = str(db)
-    
-    for k, v in cur.fetchall():
+    for composer_id, composer_data in composer_records(iter_disk_kv(db, "composerData:")):
+        yield composer_id, composer_data, db_path_str
+
+def composer_records(rows: Iterable[tuple]) -> Iterable[tuple[str, ComposerRecord]]:
+    """Decode composerData rows (ending in key, value) into (composerId, ComposerRecord), skipping bad ones."""
+    decoding = 0.0
+
+    for *_, k, v in rows:
         try:
             if v is None:
                 continue
                 
-            composer_data = json.loads(v)
+            start = time.perf_counter()
+            composer_data = decode_composer(v)
+            decoding += time.perf_counter() - start
             composer_id = k.split(":")[1]
-            yield composer_id, composer_data, db_path_str
+            yield composer_id, composer_data
             
         except Exception as e:
             logger.debug(f"Failed to parse composer data for key {k}: {e}")
             continue
-    
-    con.close()
+    metrics.record("decode", decoding)
+
+def max_rowid(db: pathlib.Path) -> int:
+    """Highest rowid in cursorDiskKV (0 if the table is missing or empty)."""
+    con = None
+    try:
+        con = sqlite_pool.connect(db)
+        row = con.execute("SELECT max(rowid) FROM cursorDiskKV").fetchone()
+        return row[0] or 0
+    except sqlite3.DatabaseError as e:
+        # Lock contention must not read as an empty table: callers retry instead
+        if sqlite_pool.is_contention(e):
+            raise
+        logger.debug(f"Database error with {db}: {e}")
+        return 0
+    finally:
+        if con is not None:
+            con.close()
+
+def disk_kv_keys(db: pathlib.Path, prefix: str) -> Optional[set[str]]:
+    """Keys in cursorDiskKV starting with `prefix`, read from the key index alone; None if unreadable."""
+    con = None
+    try:
+        con = sqlite_pool.connect(db)
+        rows = con.execute("SELECT key FROM cursorDiskKV WHERE key >= ? AND key < ?", key_range(prefix))
+        return {r[0] for r in rows}
+    except sqlite3.DatabaseError as e:
+        # An unreadable table must not read as "every key is gone"
+        if sqlite_pool.is_contention(e):
+            raise
+        logger.debug(f"Database error with {db}: {e}")
+        return None
+    finally:
+        if con is not None:
+            con.close()
+
+def iter_disk_kv_since(db: pathlib.Path, rowid: int, values: bool = False,
+                       prefix: Optional[str] = None) -> Iterable[tuple[int, str, Any]]:
+    """
+    Yield (rowid, key, value) for cursorDiskKV rows written after `rowid`.
+
+    Cursor writes with INSERT OR REPLACE, so new and rewritten rows both get a
+    fresh, higher rowid; this reads only those from the rowid B-tree. `value`
+    is None unless `values` is set; `prefix` limits the keys.
+    """
+    con = None
+    try:
+        con = sqlite_pool.connect(db)
+        cur = con.cursor()
+        sql = f"SELECT rowid, key, {'value' if values else 'NULL'} FROM cursorDiskKV WHERE rowid > ?"
+        params: tuple = (rowid,)
+        if prefix:
+            sql += " AND key >= ? AND key < ?"
+            params += key_range(prefix)
+        cur.execute(sql + " ORDER BY rowid", params)
+        while True:
+            rows = cur.fetchmany(FETCH_BATCH_SIZE)
+            if not rows:
+                return
+            yield from rows
+    except sqlite3.DatabaseError as e:
+        # Lock contention must not read as "no new rows": callers retry instead
+        if sqlite_pool.is_contention(e):
+            raise
+        logger.debug(f"Database error with {db}: {e}")
+    finally:
+        if con is not None:
+            con.close()
+
+def composer_id_from_key(key: str) -> Optional[str]:
+    """Return the composerId of a bubbleId:/composerData: key, None for other keys."""
+    if key.startswith("bubbleId:") or key.startswith("composerData:"):
+        parts = key.split(":")
+        if len(parts) > 1 and parts[1]:
+            return parts[1]
+    return None
+
+def composer_data(db: pathlib.Path, composer_id: str) -> Optional[ComposerRecord]:
+    """Return the decoded composerData row of one composer, or None."""
+    con = None
+    try:
+        con = sqlite_pool.connect(db)
+        cur = con.cursor()
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='cursorDiskKV'")
+        if not cur.fetchone():
+            return None
+        with metrics.timed("sqlite.query"):
+            cur.execute("SELECT value FROM cursorDiskKV WHERE key=?", (f"composerData:{composer_id}",))
+            row = cur.fetchone()
+        if not row or row[0] is None:
+            return None
+        count_read("cursorDiskKV:composerData", (row[0],))
+        try:
+            return decode_composer(row[0])
+        except ValueError as e:
+            logger.debug(f"Failed to parse composer data for {composer_id}: {e}")
+            return None
+    except sqlite3.DatabaseError as e:
+        if sqlite_pool.is_contention(e):
+            raise
+        logger.debug(f"Database error with {db}: {e}")
+        return None
+    finally:
+        if con is not None:
+            con.close()
 
 ################################################################################
 # Workspace discovery
@@ -305,7 +616,7 @@ def extract_project_name_from_path(root_path, debug=False):
 def workspace_info(db: pathlib.Path):
     con = None
     try:
-        con = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+        con = sqlite_pool.connect(db)
         cur = con.cursor()
 
         # Get file paths from history entries to extract the project name
@@ -362,8 +673,8 @@ def workspace_info(db: pathlib.Path):
         for c in cd.get("allComposers",[]):
             comp_meta[c["composerId"]] = {
                 "title": c.get("name","(untitled)"),
-                "createdAt": c.get("createdAt"),
-                "lastUpdatedAt": c.get("lastUpdatedAt")
+                "createdAt": normalize_timestamp(c.get("createdAt")),
+                "lastUpdatedAt": normalize_timestamp(c.get("lastUpdatedAt"))
             }
         
         # Try to get composer info from workbench.panel.aichat.view.aichat.chatdata
@@ -377,6 +688,8 @@ def workspace_info(db: pathlib.Path):
                     "lastUpdatedAt": None
                 }
     except sqlite3.DatabaseError as e:
+        if sqlite_pool.is_contention(e):
+            raise
         logger.debug(f"Error getting workspace info from {db}: {e}")
         proj = {"name": "(unknown)", "rootPath": "(unknown)"}
         comp_meta = {}
@@ -408,6 +721,2248 @@ def global_storage_path(base: pathlib.Path) -> pathlib.Path | None:
     
     return None
 
+################################################################################
+# Extraction stages
+################################################################################
+class Stage:
+    """
+    One source reader of the extraction engine.
+
+    `read(db)` returns the scan entries the stage owns for a whole database;
+    global stages also provide `read_composer(db, composerId)` for one
+    composer's rows, which always start with the composerId. `merge(state,
+    scan, db_path, ws_id)` folds the entries into a MergeState. Stages run in
+    registration order, which is also the order messages are appended in.
+
+    A global stage reading the cursorDiskKV keys under `prefix` may provide
+    `update(scan, rows)`, which folds (rowid, key, value) rows written since
+    `scan` was taken into its entries; see update_global_scan().
+    """
+    __slots__ = ("name", "kind", "keys", "read", "read_composer", "restrict", "merge", "reuse_stale",
+                 "prefix", "update")
+
+    def __init__(self, name: str, kind: str, keys: tuple[str, ...], read, merge,
+                 read_composer=None, restrict=None, reuse_stale: bool = False,
+                 prefix: Optional[str] = None, update=None):
+        self.name = name
+        self.kind = kind
+        self.keys = keys
+        self.read = read
+        self.merge = merge
+        self.read_composer = read_composer
+        # restrict(scan, composerId) -> the stage's entries for one composer
+        self.restrict = restrict or (lambda scan, cid: {k: [r for r in scan[k] if r[0] == cid] for k in keys})
+        # A cached copy may serve single-composer reads even after the DB changed
+        self.reuse_stale = reuse_stale
+        self.prefix = prefix
+        self.update = update
+
+EXTRACTION_STAGES: list[Stage] = []
+
+def register_stage(stage: Stage) -> Stage:
+    """Add a stage to the extraction engine (replacing one of the same name)."""
+    for i, existing in enumerate(EXTRACTION_STAGES):
+        if existing.name == stage.name:
+            EXTRACTION_STAGES[i] = stage
+            return stage
+    EXTRACTION_STAGES.append(stage)
+    return stage
+
+def stages(kind: str) -> list[Stage]:
+    return [s for s in EXTRACTION_STAGES if s.kind == kind]
+
+class Message:
+    """
+    One chat message: a slotted record with an interned role.
+
+    Reads like the {"role": ..., "content": ...} dict it stands for
+    (msg["role"], msg.get("content")); it only becomes one when a response
+    is encoded (see CursorJSONProvider).
+    """
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = sys.intern(role)
+        self.content = content
+
+    def __getitem__(self, key: str):
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+    def __eq__(self, other):
+        if isinstance(other, Message):
+            return self.role == other.role and self.content == other.content
+        if isinstance(other, dict):
+            return other == self.to_dict()
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content[:40]!r})"
+
+def to_json_value(obj):
+    """JSON fallback for extraction records."""
+    if isinstance(obj, Message):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+
+    class CursorJSONProvider(DefaultJSONProvider):
+        """Flask JSON provider that also encodes Message records."""
+
+        @staticmethod
+        def default(o):
+            if isinstance(o, Message):
+                return o.to_dict()
+            return DefaultJSONProvider.default(o)
+
+    app.json = CursorJSONProvider(app)
+except ImportError:
+    # Flask < 2.2
+    from flask.json import JSONEncoder
+
+    class CursorJSONEncoder(JSONEncoder):
+        def default(self, o):
+            if isinstance(o, Message):
+                return o.to_dict()
+            return super().default(o)
+
+    app.json_encoder = CursorJSONEncoder
+
+def intern_scan(scan: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Intern the composerIds and roles repeated on every row of a scan, in place.
+
+    Scans loaded from the index get a fresh string per row otherwise.
+    """
+    for key in ("messages", "bubbles"):
+        for row in scan.get(key, ()):
+            if isinstance(row[0], str):
+                row[0] = sys.intern(row[0])
+            row[1] = sys.intern(row[1])
+    composers = scan.get("composers")
+    if isinstance(composers, list):
+        for row in composers:
+            row[0] = sys.intern(row[0])
+            for msg in row[2]:
+                msg[0] = sys.intern(msg[0])
+    for tab in scan.get("tabs", ()):
+        for msg in tab[1]:
+            msg[0] = sys.intern(msg[0])
+    return scan
+
+class SessionMessages:
+    """
+    Messages collected for one composer while merging, and the DB the first came from.
+
+    The same message usually arrives from several sources: bubble rows, the
+    composerData conversation, workspace composer data and chatdata tabs.
+    add() keeps one copy of each. Copies match on bubble id when they have
+    one, otherwise on role and text, and the longest text is kept.
+    """
+    __slots__ = ("messages", "db_path", "_bubble_ids", "_by_id", "_by_text", "_seen")
+
+    def __init__(self):
+        self.messages: list[Message] = []
+        self.db_path: Optional[str] = None
+        self._bubble_ids: list[Optional[str]] = []         # parallel to messages
+        self._by_id: Dict[str, int] = {}
+        self._by_text: Dict[tuple[str, str], list[int]] = {}
+        self._seen: Dict[tuple, int] = {}                  # (source, role, text) -> copies added
+
+    def add(self, source: tuple, role: str, text: str, bubble_id: Optional[str] = None):
+        if bubble_id:
+            index = self._by_id.get(bubble_id)
+            if index is not None:
+                self._keep_best(index, role, text)
+                return
+        key = (role, text.strip())
+        # The n-th copy of a text from one source pairs with the n-th copy
+        # already collected, so a message repeated within a chat is kept.
+        seen_key = (source, *key)
+        n = self._seen.get(seen_key, 0)
+        self._seen[seen_key] = n + 1
+        same_text = self._by_text.setdefault(key, [])
+        if n < len(same_text):
+            index = same_text[n]
+            other_id = self._bubble_ids[index]
+            if not (bubble_id and other_id and other_id != bubble_id):
+                if bubble_id and not other_id:
+                    self._bubble_ids[index] = bubble_id
+                    self._by_id[bubble_id] = index
+                self._keep_best(index, role, text)
+                return
+        index = len(self.messages)
+        self.messages.append(Message(role, text))
+        self._bubble_ids.append(bubble_id or None)
+        same_text.append(index)
+        if bubble_id:
+            self._by_id[bubble_id] = index
+
+    def _keep_best(self, index: int, role: str, text: str):
+        if len(text.strip()) > len(self.messages[index].content.strip()):
+            self.messages[index] = Message(role, text)
+
+class MergeState:
+    """Accumulator the stages merge into; chats() builds the final chat list."""
+    __slots__ = ("ws_proj", "comp_meta", "comp2ws", "sessions", "source")
+
+    def __init__(self):
+        self.ws_proj  : Dict[str,Dict[str,Any]] = {}
+        self.comp_meta: Dict[str,Dict[str,Any]] = {}
+        self.comp2ws  : Dict[str,str]           = {}
+        self.sessions : Dict[str,SessionMessages] = defaultdict(SessionMessages)
+        # (stage name, db_path) of the stage merging; set by merge_scans()
+        self.source   : tuple                   = ()
+
+    def add_message(self, cid: str, role: str, text: str, db_path: Optional[str],
+                    bubble_id: Optional[str] = None):
+        session = self.sessions[cid]
+        session.add(self.source, role, text, bubble_id)
+        if session.db_path is None:
+            session.db_path = db_path
+
+    def ensure_meta(self, cid: str, ws_id: str, title: Optional[str] = None, created_at: Optional[int] = None):
+        """Placeholder metadata for a composer no workspace described."""
+        if cid not in self.comp_meta:
+            self.comp_meta[cid] = {"title": title or f"Chat {cid[:8]}",
+                                   "createdAt": created_at, "lastUpdatedAt": created_at}
+            self.comp2ws[cid] = ws_id
+
+    def chats(self) -> list[Dict[str, Any]]:
+        out = []
+        for cid, data in self.sessions.items():
+            if not data.messages:
+                continue
+            ws_id = self.comp2ws.get(cid, "(unknown)")
+            # Copy so callers can annotate the project without touching the index
+            project = dict(self.ws_proj.get(ws_id, {"name": "(unknown)", "rootPath": "(unknown)"}))
+            meta = self.comp_meta.get(cid, {"title": "(untitled)", "createdAt": None, "lastUpdatedAt": None})
+
+            chat_data = {
+                "project": project,
+                "session": {"composerId": cid, **meta},
+                "messages": data.messages,
+                "workspace_id": ws_id,
+            }
+            if data.db_path is not None:
+                chat_data["db_path"] = data.db_path
+
+            out.append(chat_data)
+
+        # Newest first; timestamps were normalized to ms ints at ingest
+        out.sort(key=chat_sort_key)
+        return out
+
+# --- workspace DB stages ------------------------------------------------------
+def read_workspace_info(db: pathlib.Path) -> Dict[str, Any]:
+    proj, meta = workspace_info(db)
+    return {"project": proj, "composers": meta}
+
+def restrict_workspace_info(scan: Dict[str, Any], composer_id: str) -> Dict[str, Any]:
+    composers = scan["composers"]
+    return {"project": scan["project"],
+            "composers": {composer_id: composers[composer_id]} if composer_id in composers else {}}
+
+def merge_workspace_info(state: MergeState, scan: Dict[str, Any], db_path: str, ws_id: str):
+    state.ws_proj[ws_id] = scan["project"]
+    for cid, m in scan["composers"].items():
+        state.comp_meta[cid] = m
+        state.comp2ws[cid] = ws_id
+
+def read_workspace_messages(db: pathlib.Path) -> Dict[str, Any]:
+    return {"messages": [[cid, role, text] for cid, role, text, _ in iter_chat_from_item_table(db)]}
+
+def merge_workspace_messages(state: MergeState, scan: Dict[str, Any], db_path: str, ws_id: str):
+    for cid, role, text in scan["messages"]:
+        state.add_message(cid, role, text, db_path)
+        state.ensure_meta(cid, ws_id)
+
+# --- global DB stages ---------------------------------------------------------
+def conversation_messages(data: ComposerRecord) -> list[list[str]]:
+    """Return [role, text, bubbleId] entries from a composerData `conversation`."""
+    conversation = []
+    for msg in data.conversation or []:
+        msg_type = msg.type
+        if msg_type is None:
+            continue
+        # Type 1 = user, Type 2 = assistant
+        role = "user" if msg_type == 1 else "assistant"
+        content = msg.text
+        if content and isinstance(content, str):
+            bubble_id = msg.bubble_id if isinstance(msg.bubble_id, str) else None
+            conversation.append([role, content, bubble_id])
+    return conversation
+
+def scan_global_tabs(db: pathlib.Path) -> list:
+    """Return [tabId, [[role, text], ...]] from the global aichat chatdata."""
+    tabs = []
+    try:
+        con = sqlite_pool.connect(db)
+        chat_data = j(con.cursor(), "ItemTable", "workbench.panel.aichat.view.aichat.chatdata")
+        if chat_data:
+            for tab in chat_data.get("tabs", []):
+                bubbles_out = []
+                for bubble in tab.get("bubbles", []):
+                    content = ""
+                    if "text" in bubble:
+                        content = bubble["text"]
+                    elif "content" in bubble:
+                        content = bubble["content"]
+                    if content and isinstance(content, str):
+                        role = "user" if bubble.get("type") == "user" else "assistant"
+                        bubbles_out.append([role, content])
+                tabs.append([tab.get("tabId"), bubbles_out])
+        con.close()
+    except Exception as e:
+        if sqlite_pool.is_contention(e):
+            raise
+        logger.debug(f"Error processing global ItemTable: {e}")
+    return tabs
+
+def bubble_rows(rows: Iterable[tuple[int, str, Any]]) -> Iterable[list[str]]:
+    """
+    Yield [composerId, role, text, bubbleId] for each (rowid, key, value) bubble row that carries text.
+
+    Rows of one composer arrive together (key order puts them in one range),
+    so only the current composer's rows are held; each group is yielded in
+    rowid order, the order Cursor wrote the conversation in.
+    """
+    group: list[tuple[int, list[str]]] = []
+    decoding = 0.0
+    clock = time.perf_counter
+    for rowid, k, v in rows:
+        start = clock()
+        message = bubble_message(k, v)
+        decoding += clock() - start
+        if message is None:
+            continue
+        cid, bubble_id, role, text = message
+        if group and group[0][1][0] != cid:
+            group.sort(key=lambda r: r[0])
+            yield from (row for _, row in group)
+            group = []
+        group.append((rowid, [cid, role, text, bubble_id]))
+    group.sort(key=lambda r: r[0])
+    yield from (row for _, row in group)
+    metrics.record("decode", decoding)
+
+def merge_global_bubbles(state: MergeState, scan: Dict[str, Any], db_path: str, ws_id: str):
+    for cid, role, text, bubble_id in scan["bubbles"]:
+        state.add_message(cid, role, text, db_path, bubble_id)
+        state.ensure_meta(cid, ws_id)
+
+def composer_row(cid: str, data: ComposerRecord) -> list:
+    return [cid, normalize_timestamp(data.created_at), conversation_messages(data)]
+
+def read_global_composer_data(db: pathlib.Path, composer_id: str) -> Dict[str, Any]:
+    data = composer_data(db, composer_id)
+    return {"composers": [composer_row(composer_id, data)] if data is not None else []}
+
+def update_global_bubbles(scan: Dict[str, Any], rows: list[tuple[int, str, Any]]) -> Dict[str, Any]:
+    """Replace the bubbles rewritten in `rows` and append the new ones, as a full scan would order them."""
+    rewritten = set()
+    for _, k, _ in rows:
+        parts = k.split(":")
+        rewritten.add((parts[1], parts[2] if len(parts) > 2 else ""))
+    cids = {cid for cid, _ in rewritten}
+    kept = [r for r in scan["bubbles"] if r[0] not in cids or (r[0], r[3]) not in rewritten]
+    return {"bubbles": kept + intern_scan({"bubbles": list(bubble_rows(rows))})["bubbles"]}
+
+def update_global_composers(scan: Dict[str, Any], rows: list[tuple[int, str, Any]]) -> Dict[str, Any]:
+    """Replace the composerData entries rewritten in `rows`; one that no longer decodes is dropped."""
+    rewritten = {k.split(":")[1] for _, k, _ in rows}
+    kept = [r for r in scan["composers"] if r[0] not in rewritten]
+    fresh = intern_scan({"composers": [composer_row(cid, data) for cid, data in composer_records(rows)]})
+    return {"composers": kept + fresh["composers"]}
+
+def merge_global_composers(state: MergeState, scan: Dict[str, Any], db_path: str, ws_id: str):
+    for cid, created_at, conversation in scan["composers"]:
+        state.ensure_meta(cid, ws_id, created_at=created_at)
+        if state.sessions[cid].db_path is None:
+            state.sessions[cid].db_path = db_path
+        for role, content, bubble_id in conversation:
+            state.add_message(cid, role, content, db_path, bubble_id)
+
+def merge_global_tabs(state: MergeState, scan: Dict[str, Any], db_path: str, ws_id: str):
+    for tab_id, bubbles in scan["tabs"]:
+        if tab_id:
+            state.ensure_meta(tab_id, ws_id, title=f"Global Chat {tab_id[:8]}")
+        for role, content in bubbles:
+            state.sessions[tab_id].add(state.source, role, content)
+
+register_stage(Stage("workspace_info", "workspace", ("project", "composers"),
+                     read_workspace_info, merge_workspace_info, restrict=restrict_workspace_info))
+register_stage(Stage("workspace_messages", "workspace", ("messages",),
+                     read_workspace_messages, merge_workspace_messages))
+register_stage(Stage("global_bubbles", "global", ("bubbles",),
+                     lambda db: {"bubbles": list(bubble_rows(iter_disk_kv(db, "bubbleId:", rowids=True)))},
+                     merge_global_bubbles,
+                     read_composer=lambda db, cid: {"bubbles": list(bubble_rows(iter_disk_kv(db, f"bubbleId:{cid}:", rowids=True)))},
+                     prefix="bubbleId:", update=update_global_bubbles))
+register_stage(Stage("global_composers", "global", ("composers",),
+                     lambda db: {"composers": [composer_row(cid, data) for cid, data, _ in iter_composer_data(db)]},
+                     merge_global_composers, read_composer=read_global_composer_data,
+                     prefix="composerData:", update=update_global_composers))
+# Legacy chatdata tabs rarely change, so a cached copy is good enough for single-chat reads
+register_stage(Stage("global_tabs", "global", ("tabs",),
+                     lambda db: {"tabs": scan_global_tabs(db)}, merge_global_tabs, reuse_stale=True))
+
+################################################################################
+# Per-database scans
+################################################################################
+def run_stages(kind: str, db: pathlib.Path) -> Dict[str, Any]:
+    scan: Dict[str, Any] = {}
+    for stage in stages(kind):
+        with metrics.timed(f"stage.{stage.name}"):
+            scan.update(stage.read(db))
+    return scan
+
+def scan_workspace_db(db: pathlib.Path) -> Dict[str, Any]:
+    """Read everything the extraction pipeline needs from one workspace DB."""
+    return run_stages("workspace", db)
+
+def scan_global_db(db: pathlib.Path) -> Dict[str, Any]:
+    """Read bubbles, composerData conversations and chatdata tabs from the global DB."""
+    return run_stages("global", db)
+
+def scan_global_composer(db: pathlib.Path, composer_id: str,
+                         cached: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Same shape as scan_global_db(), restricted to one composer.
+
+    Stages with a targeted reader only read this composer's rows (the
+    `bubbleId:<composerId>:` key range and one `composerData` row). Stages
+    marked reuse_stale take their rows from `cached`, an earlier full scan,
+    when one is given.
+    """
+    scan: Dict[str, Any] = {}
+    for stage in stages("global"):
+        with metrics.timed(f"stage.{stage.name}"):
+            if stage.reuse_stale and cached is not None:
+                scan.update(stage.restrict(cached, composer_id))
+            elif stage.read_composer is not None:
+                scan.update(stage.read_composer(db, composer_id))
+            else:
+                scan.update(stage.restrict(stage.read(db), composer_id))
+    return scan
+
+def update_global_scan(db: pathlib.Path, scan: Dict[str, Any],
+                       since: int) -> Optional[tuple[Dict[str, Any], int, set[str]]]:
+    """
+    Bring a scan_global_db() of `db` up to date from the rows written after rowid `since`.
+
+    Cursor writes cursorDiskKV with INSERT OR REPLACE, so new and rewritten
+    rows all sit above the rowid the scan was taken at; each stage folds its
+    own rows in with `update` (interning only the rows it adds), and
+    reuse_stale stages keep their entries.
+    Composers whose composerData row was deleted are dropped with all their
+    rows. `scan` itself is left untouched.
+
+    Returns (scan, rowid it is now current to, changed composerIds), or None
+    when only a full scan will do: the table shrank (the file was rewritten)
+    or a stage cannot be updated.
+    """
+    global_stages = stages("global")
+    if any(stage.update is None and not stage.reuse_stale for stage in global_stages):
+        return None
+    # Rows above `end` are left for the next update, so rows of one stage
+    # written while another stage was read cannot be skipped
+    end = max_rowid(db)
+    if end < since:
+        return None
+    updated = dict(scan)
+    changed: set[str] = set()
+    for stage in global_stages:
+        if stage.update is None:
+            continue
+        with metrics.timed(f"stage.{stage.name}"):
+            rows = [row for row in iter_disk_kv_since(db, since, values=True, prefix=stage.prefix)
+                    if row[0] <= end]
+            if rows:
+                changed.update(cid for _, k, _ in rows if (cid := composer_id_from_key(k)))
+                updated.update(stage.update(updated, rows))
+
+    live = disk_kv_keys(db, "composerData:")
+    if live is not None:
+        gone = {row[0] for row in updated.get("composers", ())} - {k.split(":")[1] for k in live}
+        if gone:
+            for stage in global_stages:
+                if stage.update is not None:
+                    updated.update({k: [r for r in updated[k] if r[0] not in gone] for k in stage.keys})
+            changed |= gone
+    return updated, end, changed
+
+def restrict_workspace_scan(scan: Dict[str, Any], composer_id: str) -> Dict[str, Any]:
+    """Return a copy of a workspace scan that only mentions `composer_id`."""
+    restricted: Dict[str, Any] = {}
+    for stage in stages("workspace"):
+        restricted.update(stage.restrict(scan, composer_id))
+    return restricted
+
+def merge_scans(workspace_scans: list[tuple[str, str, Dict[str, Any]]],
+                global_db: Optional[str], global_scan: Optional[Dict[str, Any]]) -> list[Dict[str, Any]]:
+    """
+    Merge per-database scans into the chat list returned by extract_chats().
+
+    `workspace_scans` is a list of (workspace_id, db_path, scan) in discovery
+    order; later workspaces win when they describe the same composer.
+    """
+    with metrics.timed("merge"):
+        return _merge_scans(workspace_scans, global_db, global_scan)
+
+def _merge_scans(workspace_scans, global_db, global_scan) -> list[Dict[str, Any]]:
+    state = MergeState()
+    # 1. Workspace DBs first
+    for ws_id, db_path, scan in workspace_scans:
+        for stage in stages("workspace"):
+            state.source = (stage.name, db_path)
+            stage.merge(state, scan, db_path, ws_id)
+    # 2. Global storage
+    if global_scan is not None:
+        for stage in stages("global"):
+            state.source = (stage.name, global_db)
+            stage.merge(state, global_scan, global_db, "(global)")
+    # 3. Build final list
+    return state.chats()
+
+def chat_sort_key(chat: Dict[str, Any]) -> tuple[int, str]:
+    """Sort key for listings: newest lastUpdatedAt first, composerId breaks ties."""
+    # Legacy tabs without a tabId are listed under composerId None
+    return (-(chat["session"].get("lastUpdatedAt") or 0), chat["session"]["composerId"] or "")
+
+################################################################################
+# Persistent chat index
+################################################################################
+# Bump whenever the shape of a stored scan changes; older sidecars are rebuilt.
+INDEX_SCHEMA_VERSION = 5
+
+# Generations of changed composers the index remembers for refresh_changes()
+CHANGE_LOG_SIZE = 256
+
+# Number of databases scanned concurrently when several changed at once
+SCAN_WORKERS = int(os.environ.get("CURSOR_LIVE_SCAN_WORKERS", "0")) or min(8, os.cpu_count() or 1)
+
+def cache_dir() -> pathlib.Path:
+    """Directory holding the sidecar index (override with CURSOR_LIVE_CACHE_DIR)."""
+    override = os.environ.get("CURSOR_LIVE_CACHE_DIR")
+    if override:
+        return pathlib.Path(override).expanduser()
+    h = pathlib.Path.home()
+    s = platform.system()
+    if s == "Darwin":   return h / "Library" / "Caches" / "cursor-live"
+    if s == "Windows":  return h / "AppData" / "Local" / "cursor-live"
+    return pathlib.Path(os.environ.get("XDG_CACHE_HOME") or h / ".cache") / "cursor-live"
+
+def db_fingerprint(db: pathlib.Path) -> Optional[tuple[int, int, int, int]]:
+    """Return (size, mtime_ns, wal_size, wal_mtime_ns) for a DB, or None if it is gone."""
+    try:
+        st = db.stat()
+    except OSError:
+        return None
+    try:
+        wal = db.with_name(db.name + "-wal").stat()
+        wal_fp = (wal.st_size, wal.st_mtime_ns)
+    except OSError:
+        wal_fp = (0, 0)
+    return (st.st_size, st.st_mtime_ns, *wal_fp)
+
+def read_scan(scanner, db: pathlib.Path) -> Dict[str, Any]:
+    """
+    Run a full scan of `db` as one unit of work.
+
+    With CURSOR_LIVE_SNAPSHOT set, every stage reads the same consistent copy
+    of the database; a scan that hits Cursor's write lock is retried with
+    backoff rather than cached with a source missing.
+    """
+    def attempt():
+        with sqlite_pool.snapshot(db):
+            return scanner(db)
+    return sqlite_pool.with_retry(attempt)
+
+class ChatIndex:
+    """
+    Sidecar SQLite index of per-database scans.
+
+    Every source state.vscdb is stored with its fingerprint, so a refresh only
+    re-reads the databases that changed since they were last scanned. The
+    global scan is stored one row per composer and only the composers whose
+    rows changed are rewritten. It also remembers the file identity and the
+    highest cursorDiskKV rowid it covers, so a changed global DB is brought
+    up to date from the rows written since (update_global_scan()) instead of
+    being read in full. If the sidecar cannot be opened the index keeps
+    working in memory only.
+    """
+
+    def __init__(self, path: pathlib.Path, workers: Optional[int] = None):
+        self.path = path
+        # Thread pool size for scanning changed databases (defaults to SCAN_WORKERS)
+        self.workers = workers
+        self._lock = threading.RLock()
+        self._con: Optional[sqlite3.Connection] = None
+        self._con_failed = False
+        self._scans: Dict[str, tuple[tuple, Dict[str, Any]]] = {}
+        # Per workspace DB, its (composerId, lastUpdatedAt ms) newest first, and
+        # per composerId the workspace DBs listing it; kept in step with the
+        # workspace scans
+        self._candidates: Dict[str, list[tuple[str, int]]] = {}
+        self._listed_in: Dict[str, set[str]] = {}
+        # Cached global scans grouped by composerId: path -> (fp, {scan key: {cid: rows}})
+        self._groups: Dict[str, tuple[tuple, Dict[str, Dict[str, list]]]] = {}
+        # Bumped whenever a cached scan is replaced or dropped
+        self.generation = 0
+        # (generation, composerIds whose merged chat may differ, or None for any) per bump
+        self._changes: deque[tuple[int, Optional[frozenset]]] = deque(maxlen=CHANGE_LOG_SIZE)
+        # Global DBs whose per-composer rows must be rewritten in full (a store failed)
+        self._unsynced: set[str] = set()
+        # Per global DB, the (file identity, cursorDiskKV rowid) its cached scan covers
+        self._marks: Dict[str, tuple[Optional[tuple[int, int]], int]] = {}
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._con is not None or self._con_failed:
+            return self._con
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(str(self.path), check_same_thread=False)
+            if con.execute("PRAGMA user_version").fetchone()[0] != INDEX_SCHEMA_VERSION:
+                con.execute("DROP TABLE IF EXISTS sources")
+                con.execute("DROP TABLE IF EXISTS composer_rows")
+                con.execute(f"PRAGMA user_version = {INDEX_SCHEMA_VERSION}")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS sources (
+                    path         TEXT PRIMARY KEY,
+                    kind         TEXT NOT NULL,
+                    size         INTEGER NOT NULL,
+                    mtime_ns     INTEGER NOT NULL,
+                    wal_size     INTEGER NOT NULL,
+                    wal_mtime_ns INTEGER NOT NULL,
+                    scan         TEXT NOT NULL,
+                    scanned_at   REAL NOT NULL,
+                    dev          INTEGER,
+                    ino          INTEGER,
+                    last_rowid   INTEGER
+                )""")
+            # Global scans: each composer's rows ({scan key: rows}), keyed by its JSON-encoded id
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS composer_rows (
+                    path TEXT NOT NULL,
+                    cid  TEXT NOT NULL,
+                    rows TEXT NOT NULL,
+                    PRIMARY KEY (path, cid)
+                )""")
+            con.commit()
+            self._con = con
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Chat index unavailable at {self.path}, continuing in memory: {e}")
+            self._con_failed = True
+        return self._con
+
+    def _stored_scan(self, key: str, fp: Optional[tuple]) -> Optional[tuple[Dict[str, Any], Optional[tuple]]]:
+        """(scan, rowid mark) stored for `key` if it was taken at `fp`; with fp None, whatever it was taken at."""
+        con = self._connection()
+        if con is None:
+            return None
+        try:
+            row = con.execute(
+                "SELECT size, mtime_ns, wal_size, wal_mtime_ns, scan, kind, dev, ino, last_rowid "
+                "FROM sources WHERE path=?", (key,)).fetchone()
+            if row and (fp is None or tuple(row[:4]) == fp):
+                with metrics.timed("index.load"):
+                    scan = json_loads(row[4])
+                    if row[5] == "global":
+                        for (rows,) in con.execute("SELECT rows FROM composer_rows WHERE path=?", (key,)):
+                            for k, part in json_loads(rows).items():
+                                scan.setdefault(k, []).extend(part)
+                    identity = (row[6], row[7]) if row[6] is not None else None
+                    mark = (identity, row[8]) if row[8] is not None else None
+                    return scan, mark
+        except (sqlite3.Error, ValueError) as e:
+            logger.debug(f"Ignoring unreadable index entry for {key}: {e}")
+        return None
+
+    def _store_scan(self, key: str, kind: str, fp: tuple, scan: Dict[str, Any],
+                    previous: Optional[Dict[str, Any]] = None, mark: Optional[tuple] = None,
+                    changed: Optional[set[str]] = None):
+        """
+        Store a scan in the sidecar. For a global scan `previous` is the scan
+        stored before it; only the composers whose rows differ (or, when the
+        caller knows them, the `changed` ones) are written.
+        """
+        con = self._connection()
+        if con is None:
+            return
+        try:
+            with metrics.timed("index.store"):
+                stored = scan
+                if kind == "global":
+                    if key in self._unsynced:
+                        previous = changed = None
+                    self._store_composer_rows(con, key, scan, previous, changed)
+                    stored = {k: [] for k in scan}
+                identity, last_rowid = mark if mark is not None else (None, None)
+                dev, ino = identity if identity is not None else (None, None)
+                con.execute("INSERT OR REPLACE INTO sources VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                            (key, kind, *fp, json.dumps(stored), time.time(), dev, ino, last_rowid))
+            self._unsynced.discard(key)
+        except sqlite3.Error as e:
+            logger.debug(f"Failed to store index entry for {key}: {e}")
+            if kind == "global":
+                self._unsynced.add(key)
+
+    @staticmethod
+    def _rows_by_composer(scan: Dict[str, Any], only: Optional[set] = None) -> Dict[Any, Dict[str, list]]:
+        """Group a global scan by composer (every row starts with its id): cid -> {scan key: rows}."""
+        grouped: Dict[Any, Dict[str, list]] = defaultdict(dict)
+        for k, rows in scan.items():
+            for row in rows:
+                if only is None or row[0] in only:
+                    grouped[row[0]].setdefault(k, []).append(row)
+        return grouped
+
+    def _store_composer_rows(self, con: sqlite3.Connection, key: str, scan: Dict[str, Any],
+                             previous: Optional[Dict[str, Any]], changed: Optional[set[str]] = None):
+        if changed is not None:
+            new = self._rows_by_composer(scan, changed)
+            changed, gone = list(new), [cid for cid in changed if cid not in new]
+        elif previous is None:
+            new = self._rows_by_composer(scan)
+            con.execute("DELETE FROM composer_rows WHERE path=?", (key,))
+            changed, gone = list(new), []
+        else:
+            new = self._rows_by_composer(scan)
+            old = self._rows_by_composer(previous)
+            changed = [cid for cid, rows in new.items() if old.get(cid) != rows]
+            gone = [cid for cid in old if cid not in new]
+        con.executemany("DELETE FROM composer_rows WHERE path=? AND cid=?",
+                        [(key, json.dumps(cid)) for cid in gone])
+        con.executemany("INSERT OR REPLACE INTO composer_rows VALUES (?,?,?)",
+                        [(key, json.dumps(cid), json.dumps(new[cid])) for cid in changed])
+        logger.debug(f"Stored {len(changed)} changed composers of {key}, dropped {len(gone)}")
+
+    def _commit(self):
+        if self._con is None:
+            return
+        try:
+            self._con.commit()
+        except sqlite3.Error as e:
+            logger.debug(f"Failed to commit chat index: {e}")
+
+    def _cached(self, key: str, kind: str, fp: tuple) -> Optional[Dict[str, Any]]:
+        """Return a scan from memory or the sidecar if it matches `fp`."""
+        cached = self._scans.get(key)
+        if cached and cached[0] == fp:
+            metrics.cache_lookup("index_memory", True)
+            return cached[1]
+        metrics.cache_lookup("index_memory", False)
+        stored = self._stored_scan(key, fp)
+        metrics.cache_lookup("index_sidecar", stored is not None)
+        if stored is None:
+            return None
+        self._set(key, kind, fp, stored[0], stored[1])
+        return stored[0]
+
+    def _remember(self, key: str, kind: str, fp: tuple, scan: Dict[str, Any],
+                  mark: Optional[tuple] = None, changed: Optional[set[str]] = None):
+        previous = self._scans.get(key)
+        self._store_scan(key, kind, fp, scan, previous[1] if previous else None, mark, changed)
+        # An updated scan only added rows its stages interned already
+        self._set(key, kind, fp, scan, mark, changed, interned=changed is not None)
+
+    def _set(self, key: str, kind: str, fp: tuple, scan: Dict[str, Any], mark: Optional[tuple] = None,
+             changed: Optional[set[str]] = None, interned: bool = False):
+        """Cache a scan; `changed` lists the composers a global scan touched (None: unknown)."""
+        self._scans[key] = (fp, scan if interned else intern_scan(scan))
+        if kind == "workspace":
+            # Every composer the workspace listed before or lists now
+            changed = {cid for cid, _ in self._candidates.get(key, ())}
+            self._index_composers(key, scan)
+            changed.update(cid for cid, _ in self._candidates.get(key, ()))
+        elif mark is not None:
+            self._marks[key] = mark
+        else:
+            self._marks.pop(key, None)
+        self._bump(changed)
+
+    def _bump(self, changed: Optional[set[str]]):
+        self.generation += 1
+        self._changes.append((self.generation, frozenset(changed) if changed is not None else None))
+
+    @staticmethod
+    def _global_mark(db: pathlib.Path) -> Optional[tuple]:
+        """(file identity, highest cursorDiskKV rowid) of a global DB about to be scanned in full."""
+        try:
+            return sqlite_pool.file_identity(str(db)), sqlite_pool.with_retry(max_rowid, db)
+        except sqlite3.OperationalError as e:
+            # Without a mark the next change is read with a full scan again
+            logger.debug(f"Could not read the rowid mark of {db}: {e}")
+            return None
+
+    def _update_global(self, db: pathlib.Path, fp: tuple) -> Optional[Dict[str, Any]]:
+        """
+        Bring the cached scan of a changed global DB up to date from its new rows.
+
+        Returns None when a full scan is needed: nothing usable is cached, or
+        the file was replaced or shrank since the cached scan was taken.
+        """
+        key = str(db)
+        cached, mark = self._scans.get(key), self._marks.get(key)
+        if cached is not None and mark is not None:
+            previous = cached[1]
+        else:
+            stored = self._stored_scan(key, None)
+            if stored is None or stored[1] is None:
+                return None
+            previous, mark = intern_scan(stored[0]), stored[1]
+        identity, since = mark
+        if identity is None or identity != sqlite_pool.file_identity(key):
+            return None
+        updated = read_scan(lambda db: update_global_scan(db, previous, since), db)
+        if updated is None:
+            return None
+        scan, end, changed = updated
+        logger.debug(f"Updated {len(changed)} composers of {db} from rows after {since}")
+        self._remember(key, "global", fp, scan, (identity, end), changed)
+        self._commit()
+        return scan
+
+    def _index_composers(self, key: str, scan: Optional[Dict[str, Any]]):
+        """Update the candidate sessions of one workspace scan (None drops it)."""
+        for cid, _ in self._candidates.pop(key, []):
+            listed = self._listed_in.get(cid)
+            if listed is not None:
+                listed.discard(key)
+                if not listed:
+                    del self._listed_in[cid]
+        if scan is None:
+            return
+        # Candidates: composer metadata plus sessions only seen in ItemTable
+        last_updated = {cid: meta.get("lastUpdatedAt") or meta.get("createdAt") or 0
+                        for cid, meta in scan["composers"].items()}
+        for cid, _, _ in scan["messages"]:
+            last_updated.setdefault(cid, 0)
+        # Newest first; untimestamped sessions keep their discovery order at the end
+        self._candidates[key] = sorted(last_updated.items(), key=lambda item: -item[1])
+        for cid in last_updated:
+            self._listed_in.setdefault(cid, set()).add(key)
+
+    def scan(self, db: pathlib.Path, kind: str, scanner) -> Optional[Dict[str, Any]]:
+        """Return the scan of `db`, re-running `scanner` only if its fingerprint changed."""
+        key = str(db)
+        fp = db_fingerprint(db)
+        if fp is None:
+            return None
+        with self._lock:
+            scan = self._cached(key, kind, fp)
+            if scan is None:
+                logger.debug(f"Scanning changed {kind} database: {db}")
+                scan = read_scan(scanner, db)
+                self._remember(key, kind, fp, scan)
+                self._commit()
+            return scan
+
+    def prune(self, live: set[str]):
+        """Forget databases that no longer exist on disk."""
+        with self._lock:
+            for key in [k for k in self._scans if k not in live]:
+                del self._scans[key]
+                self._groups.pop(key, None)
+                self._marks.pop(key, None)
+                self._index_composers(key, None)
+                self._bump(None)
+            con = self._connection()
+            if con is None:
+                return
+            try:
+                stored = [r[0] for r in con.execute("SELECT path FROM sources")]
+                gone = [(k,) for k in stored if k not in live]
+                if gone:
+                    con.executemany("DELETE FROM sources WHERE path=?", gone)
+                    con.executemany("DELETE FROM composer_rows WHERE path=?", gone)
+                    con.commit()
+            except sqlite3.Error as e:
+                logger.debug(f"Failed to prune chat index: {e}")
+
+    def workspace_composers(self, db: pathlib.Path) -> Optional[tuple[Dict[str, Any], list[tuple[str, int]]]]:
+        """
+        Return (scan, [(composerId, lastUpdatedAt ms), ...]) for one workspace DB.
+
+        The list is newest first, with untimestamped sessions (0) last. Only
+        this workspace is re-scanned, and only if it changed.
+        """
+        scan = self.scan(db, "workspace", scan_workspace_db)
+        if scan is None:
+            return None
+        with self._lock:
+            return scan, list(self._candidates.get(str(db), []))
+
+    def composer_workspaces(self, composer_id: str) -> list[str]:
+        """Workspace DB paths whose indexed scan lists `composer_id`."""
+        with self._lock:
+            return sorted(self._listed_in.get(composer_id, ()))
+
+    def global_composer_scan(self, global_db: pathlib.Path, composer_id: str) -> Dict[str, Any]:
+        """
+        scan_global_composer() of one composer, from already materialized state when possible.
+
+        While the global DB is unchanged its cached full scan is grouped by
+        composer once and every lookup is a dict access; after a change only
+        this composer's rows are read from the DB (retried while it is locked).
+        """
+        key = str(global_db)
+        fp = db_fingerprint(global_db)
+        with self._lock:
+            cached = self._scans.get(key)
+            if cached is not None and cached[0] == fp:
+                groups = self._groups.get(key)
+                metrics.cache_lookup("composer_groups", groups is not None and groups[0] == fp)
+                if groups is None or groups[0] != fp:
+                    groups = (fp, {k: self._group(cached[1][k])
+                                   for stage in stages("global") for k in stage.keys})
+                    self._groups[key] = groups
+                return {k: by_cid.get(composer_id, []) for k, by_cid in groups[1].items()}
+        stale = cached[1] if cached else None
+        # Same unit of work as a full scan: one snapshot, retried on lock contention
+        return read_scan(lambda db: scan_global_composer(db, composer_id, cached=stale), global_db)
+
+    @staticmethod
+    def _group(rows: list) -> Dict[str, list]:
+        by_cid: Dict[str, list] = defaultdict(list)
+        for row in rows:
+            by_cid[row[0]].append(row)
+        return dict(by_cid)
+
+    def composer_chat(self, workspace_scans: list[tuple[str, str, Dict[str, Any]]],
+                      global_db: Optional[pathlib.Path], composer_id: str) -> Optional[Dict[str, Any]]:
+        """Merge one composer's chat from the given workspace scans and the global DB."""
+        restricted = [(ws_id, path, restrict_workspace_scan(scan, composer_id))
+                      for ws_id, path, scan in workspace_scans]
+        global_scan = self.global_composer_scan(global_db, composer_id) if global_db else None
+        for chat in merge_scans(restricted, str(global_db) if global_db else None, global_scan):
+            if chat["session"]["composerId"] == composer_id:
+                return chat
+        return None
+
+    def stale(self, db: pathlib.Path) -> bool:
+        """True if `db` changed since it was last scanned (or was never scanned)."""
+        with self._lock:
+            cached = self._scans.get(str(db))
+            return cached is None or cached[0] != db_fingerprint(db)
+
+    def collect(self, root: pathlib.Path, include_global: bool = True):
+        """
+        Refresh changed databases under `root`.
+
+        Returns (workspace_scans, global_db_path, global_scan) ready for merge_scans().
+        With include_global=False the global DB is left alone and global_scan is None.
+        """
+        return self._collect(root, include_global)[0]
+
+    def refresh_changes(self, root: pathlib.Path, since: int):
+        """
+        collect() everything, and say what changed since generation `since`.
+
+        Returns (scans, changed, generation): collect()'s result, the
+        composerIds changed from `since` up to `generation` (None when any
+        may have), and the generation the scans are current to.
+        """
+        scans, generation = self._collect(root, True)
+        return scans, self._changes_between(since, generation), generation
+
+    def _changes_between(self, since: int, generation: int) -> Optional[set[str]]:
+        """
+        composerIds whose merged chat may differ between two generations.
+
+        None when that is unknown: a global DB was scanned in full, a
+        database was dropped, or `since` is older than the change log.
+        """
+        with self._lock:
+            if since == generation:
+                return set()
+            if since < 0 or not self._changes or self._changes[0][0] > since + 1:
+                return None
+            out: set[str] = set()
+            for gen, cids in self._changes:
+                if since < gen <= generation:
+                    if cids is None:
+                        return None
+                    out |= cids
+            return out
+
+    def _collect(self, root: pathlib.Path, include_global: bool):
+        sources = [(ws_id, db, "workspace", scan_workspace_db) for ws_id, db in workspaces(root)]
+        global_db = global_storage_path(root)
+        if global_db and include_global:
+            sources.append((None, global_db, "global", scan_global_db))
+
+        with self._lock:
+            scans: Dict[str, Dict[str, Any]] = {}
+            pending = []
+            for _, db, kind, scanner in sources:
+                fp = db_fingerprint(db)
+                if fp is None:
+                    continue
+                scan = self._cached(str(db), kind, fp)
+                if scan is None and kind == "global":
+                    try:
+                        scan = self._update_global(db, fp)
+                    except Exception as e:
+                        logger.debug(f"Incremental update of {db} failed, scanning it in full: {e}")
+                if scan is None:
+                    mark = self._global_mark(db) if kind == "global" else None
+                    pending.append((db, kind, scanner, fp, mark))
+                else:
+                    scans[str(db)] = scan
+
+            # SQLite releases the GIL while it reads, so changed databases are
+            # scanned concurrently; results are merged below in discovery order.
+            # Each scan runs in a copy of this context so it is timed as part of the request.
+            if pending:
+                logger.debug(f"Scanning {len(pending)} changed databases")
+                workers = max(1, min(self.workers or SCAN_WORKERS, len(pending)))
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan") as pool:
+                    futures = [(db, kind, fp, mark,
+                                pool.submit(contextvars.copy_context().run, read_scan, scanner, db))
+                               for db, kind, scanner, fp, mark in pending]
+                    for db, kind, fp, mark, future in futures:
+                        try:
+                            scan = future.result()
+                        except Exception as e:
+                            logger.error(f"Failed to scan {kind} database {db}: {e}")
+                            # Keep serving the last good scan; the changed fingerprint retries it next time
+                            previous = self._scans.get(str(db))
+                            if previous is not None:
+                                scans[str(db)] = previous[1]
+                            continue
+                        self._remember(str(db), kind, fp, scan, mark)
+                        scans[str(db)] = scan
+                self._commit()
+
+            workspace_scans = [(ws_id, str(db), scans[str(db)])
+                               for ws_id, db, kind, _ in sources
+                               if kind == "workspace" and str(db) in scans]
+            global_scan = scans.get(str(global_db)) if global_db and include_global else None
+            live = set(scans)
+            generation = self.generation
+        logger.debug(f"Indexed {len(workspace_scans)} workspaces")
+
+        if include_global:
+            # A database dropped here is logged as a change after `generation`
+            self.prune(live)
+        return (workspace_scans, str(global_db) if global_db else None, global_scan), generation
+
+    def load_chat(self, root: pathlib.Path, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Materialize a single session without rescanning the global DB.
+
+        Workspace scans come from the index; from the global DB only the rows
+        of this composer are read, so the cost is proportional to the chat.
+        """
+        return next(self.load_chats(root, [session_id]))[1]
+
+    def load_chats(self, root: pathlib.Path,
+                   session_ids: Iterable[str]) -> Iterable[tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Yield (session_id, chat or None) like load_chat() for several sessions.
+
+        The workspaces are collected once for all of them.
+        """
+        workspace_scans, global_db, _ = self.collect(root, include_global=False)
+        global_path = pathlib.Path(global_db) if global_db else None
+        for session_id in session_ids:
+            yield session_id, self.composer_chat(workspace_scans, global_path, session_id)
+
+    def extract(self, root: pathlib.Path) -> list[Dict[str, Any]]:
+        """Refresh changed databases under `root` and return the merged chat list."""
+        out = merge_scans(*self.collect(root))
+        logger.debug(f"Total chat sessions extracted: {len(out)}")
+        return out
+
+_chat_index: Optional[ChatIndex] = None
+_chat_index_lock = threading.Lock()
+
+def chat_index() -> ChatIndex:
+    """Return the process-wide chat index, creating it on first use."""
+    global _chat_index
+    with _chat_index_lock:
+        if _chat_index is None:
+            _chat_index = ChatIndex(cache_dir() / "chat_index.sqlite")
+        return _chat_index
+
+################################################################################
+# In-memory session store
+################################################################################
+# Seconds during which the store is trusted without re-checking fingerprints
+STORE_REFRESH_INTERVAL = float(os.environ.get("CURSOR_LIVE_REFRESH_INTERVAL", "1.0"))
+
+class SessionStore:
+    """
+    Process-wide merged view of all chat sessions, keyed by composerId.
+
+    The store is rebuilt from the index's cached scans only when one of the
+    source databases changed, so single-chat reads are a dict lookup. When
+    the index can tell which composers changed, only those sessions are
+    re-merged and re-digested; the rest keep their versions and chains.
+    """
+
+    def __init__(self, index: ChatIndex):
+        self.index = index
+        self._lock = threading.Lock()
+        self._root: Optional[pathlib.Path] = None
+        self._generation = -1
+        self._checked_at = 0.0
+        self._chats: list[Dict[str, Any]] = []
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        # chat_sort_key() of each entry of _chats, for bisecting page cursors
+        self._sort_keys: list[tuple[int, str]] = []
+        self._versions: Optional[Dict[str, str]] = None
+        # composerId -> (chat, message_chain(chat)) for delta fetches
+        self._chains: Dict[str, tuple[Dict[str, Any], list[str]]] = {}
+
+    def _refresh(self):
+        root = cursor_root()
+        now = time.monotonic()
+        if root == self._root and now - self._checked_at < STORE_REFRESH_INTERVAL:
+            return
+        scans, changed, generation = self.index.refresh_changes(root, self._generation)
+        # Past a quarter of the sessions one merge of everything is cheaper
+        rebuild = root != self._root or changed is None or len(changed) > len(self._chats) // 4
+        metrics.cache_lookup("session_store", not rebuild)
+        if rebuild:
+            self._chats = merge_scans(*scans)
+            self._by_id = {c["session"]["composerId"]: c for c in self._chats}
+            self._sort_keys = [chat_sort_key(c) for c in self._chats]
+            self._versions = None
+            self._chains = {}
+            self._root = root
+            logger.debug(f"Session store rebuilt with {len(self._chats)} sessions")
+        elif changed:
+            self._patch(scans, changed)
+            logger.debug(f"Session store re-merged {len(changed)} changed sessions")
+        self._generation = generation
+        self._checked_at = now
+
+    def _patch(self, scans, changed: set[str]):
+        """Re-merge only the `changed` sessions, keeping the listing sorted."""
+        workspace_scans, global_db, _ = scans
+        global_path = pathlib.Path(global_db) if global_db else None
+        # Callers may still be iterating the old list and versions: replace, don't mutate
+        chats = list(self._chats)
+        versions = dict(self._versions) if self._versions is not None else None
+        for cid in changed:
+            chat = self.index.composer_chat(workspace_scans, global_path, cid)
+            old = self._by_id.pop(cid, None)
+            if old is not None:
+                i = bisect.bisect_left(self._sort_keys, chat_sort_key(old))
+                del chats[i], self._sort_keys[i]
+            self._chains.pop(cid, None)
+            if versions is not None:
+                versions.pop(cid, None)
+            if chat is None:
+                continue
+            key = chat_sort_key(chat)
+            i = bisect.bisect_left(self._sort_keys, key)
+            chats.insert(i, chat)
+            self._sort_keys.insert(i, key)
+            self._by_id[cid] = chat
+            if versions is not None:
+                versions[cid] = session_digest(chat)
+        self._chats = chats
+        self._versions = versions
+
+    def chats(self) -> list[Dict[str, Any]]:
+        """All sessions, newest first."""
+        with self._lock:
+            self._refresh()
+            return self._chats
+
+    def snapshot(self) -> tuple[list[Dict[str, Any]], Dict[str, str], int]:
+        """
+        All sessions, their versions (composerId -> content digest, computed
+        once per rebuild) and the index generation they were built from, taken
+        together so they always describe the same rebuild.
+        """
+        with self._lock:
+            self._refresh()
+            return self._chats, self._current_versions(), self._generation
+
+    def _current_versions(self) -> Dict[str, str]:
+        if self._versions is None:
+            self._versions = {cid: session_digest(chat) for cid, chat in self._by_id.items()}
+        return self._versions
+
+    def page(self, limit: int, cursor: Optional[str] = None):
+        """
+        Return (chats, next_cursor, total) for one page of the newest-first listing.
+
+        `cursor` is the opaque token returned with the previous page; finding
+        the page start is a bisect, so each page costs O(log n + limit).
+        """
+        after = decode_page_cursor(cursor) if cursor else None
+        with self._lock:
+            self._refresh()
+            start = bisect.bisect_right(self._sort_keys, after) if after else 0
+            chats = self._chats[start:start + limit]
+            total = len(self._chats)
+            has_more = start + limit < total
+        next_cursor = encode_page_cursor(chat_sort_key(chats[-1])) if chats and has_more else None
+        return chats, next_cursor, total
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up one session by composerId.
+
+        If the global DB changed since the last rebuild, only this session is
+        re-read from it instead of rescanning the whole global history.
+        """
+        with self._lock:
+            root = cursor_root()
+            if root == self._root and time.monotonic() - self._checked_at < STORE_REFRESH_INTERVAL:
+                return self._by_id.get(session_id)
+            global_db = global_storage_path(root)
+            if global_db is not None and self.index.stale(global_db):
+                return self.index.load_chat(root, session_id)
+            self._refresh()
+            return self._by_id.get(session_id)
+
+    def message_chain(self, chat: Dict[str, Any]) -> list[str]:
+        """message_chain() of a session, cached for as long as the store holds that chat."""
+        cid = chat["session"]["composerId"]
+        with self._lock:
+            cached = self._chains.get(cid)
+        if cached is not None and cached[0] is chat:
+            return cached[1]
+        chain = message_chain(chat["messages"])
+        with self._lock:
+            if self._by_id.get(cid) is chat:
+                self._chains[cid] = (chat, chain)
+        return chain
+
+    def covers(self, paths: Iterable[pathlib.Path]) -> bool:
+        """True if the store is built from the current state of every database in `paths` (stat() calls only)."""
+        with self._lock:
+            if self._root != cursor_root() or self._generation != self.index.generation:
+                return False
+        return not any(self.index.stale(path) for path in paths)
+
+    def invalidate(self):
+        """Force the next read to re-check every source database."""
+        with self._lock:
+            self._checked_at = 0.0
+
+def session_digest(chat: Dict[str, Any]) -> str:
+    """Content digest of a merged session: changes whenever its title, project or messages do."""
+    h = hashlib.blake2b(digest_size=12)
+    session = chat["session"]
+    for part in (session.get("title"), chat["project"].get("name"), session.get("lastUpdatedAt")):
+        h.update(str(part).encode("utf-8", "surrogatepass"))
+        h.update(b"\0")
+    for msg in chat["messages"]:
+        h.update(msg["role"].encode())
+        h.update(b"\0")
+        h.update(msg["content"].encode("utf-8", "surrogatepass"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def message_chain(messages: list[Dict[str, Any]]) -> list[str]:
+    """
+    Rolling digests of a message list: entry i covers messages[:i + 1].
+
+    Two lists share their first n messages iff their chains agree at n - 1,
+    which is what lets a version token identify where a delta starts.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    chain = []
+    for msg in messages:
+        h.update(msg["role"].encode())
+        h.update(b"\0")
+        h.update(msg["content"].encode("utf-8", "surrogatepass"))
+        h.update(b"\0")
+        chain.append(h.copy().hexdigest())
+    return chain
+
+def message_version(chain: list[str]) -> str:
+    """Version token for a message list: its length plus the digests of its last two prefixes."""
+    n = len(chain)
+    previous = chain[n - 2] if n > 1 else ""
+    current = chain[n - 1] if n else ""
+    return f"{n}.{previous}.{current}"
+
+def delta_start(chain: list[str], since: str) -> tuple[int, bool]:
+    """
+    Resolve a `since` value against the current chain into (start, reset).
+
+    `since` is either a message index or a token from message_version().
+    Messages from `start` on are new or changed. If the token matches neither
+    its full prefix nor all but its last message (a reply still being
+    written), the history was rewritten and `reset` asks for a full reload.
+    """
+    if since.isdigit():
+        return min(int(since), len(chain)), False
+    try:
+        n_str, previous, current = since.split(".")
+        n = int(n_str)
+    except ValueError:
+        raise ValueError(f"Invalid since token: {since}")
+    if n == 0:
+        return 0, False
+    if n <= len(chain) and chain[n - 1] == current:
+        return n, False
+    if n == 1 or (n - 1 <= len(chain) and chain[n - 2] == previous):
+        return n - 1, False
+    return 0, True
+
+def encode_page_cursor(key: tuple[int, str]) -> str:
+    """Encode a chat_sort_key() as an opaque, URL-safe page cursor."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+def decode_page_cursor(cursor: str) -> tuple[int, str]:
+    """Inverse of encode_page_cursor(); raises ValueError on malformed input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, cid = json.loads(raw)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(ts, int) or not isinstance(cid, str):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return ts, cid
+
+_session_store: Optional[SessionStore] = None
+
+def session_store() -> SessionStore:
+    """Return the process-wide session store, creating it on first use."""
+    global _session_store
+    index = chat_index()
+    with _chat_index_lock:
+        if _session_store is None:
+            _session_store = SessionStore(index)
+        return _session_store
+
+################################################################################
+# Full-text search
+################################################################################
+# Bump when the search schema changes; older sidecars are rebuilt.
+SEARCH_SCHEMA_VERSION = 1
+
+class SearchIndex:
+    """
+    SQLite FTS5 sidecar over message content, session title and project name.
+
+    Messages carry no timestamps of their own, so each one is indexed with
+    its session's lastUpdatedAt (or createdAt); time filters select sessions.
+
+    The index is synced from the session store: only sessions whose content
+    digest changed since the last sync are re-indexed, so after the initial
+    build an update costs as much as the sessions Cursor actually touched.
+    Uses the trigram tokenizer when SQLite has it, so substrings of CJK text
+    match too.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._con: Optional[sqlite3.Connection] = None
+        self._synced_generation = -1
+        self.tokenizer = "unicode61 remove_diacritics 2"
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._con is not None:
+            return self._con
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(str(self.path), check_same_thread=False)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Search index unavailable at {self.path}, using memory: {e}")
+            con = sqlite3.connect(":memory:", check_same_thread=False)
+        try:
+            con.execute("CREATE VIRTUAL TABLE temp.probe USING fts5(x, tokenize='trigram')")
+            con.execute("DROP TABLE temp.probe")
+            self.tokenizer = "trigram"
+        except sqlite3.OperationalError:
+            pass
+        if con.execute("PRAGMA user_version").fetchone()[0] != SEARCH_SCHEMA_VERSION:
+            con.executescript("""
+                DROP TABLE IF EXISTS search;
+                DROP TABLE IF EXISTS docs;
+                DROP TABLE IF EXISTS indexed_sessions;
+            """)
+            con.execute(f"PRAGMA user_version = {SEARCH_SCHEMA_VERSION}")
+        con.executescript(f"""
+            CREATE TABLE IF NOT EXISTS docs (
+                id           INTEGER PRIMARY KEY,
+                session_id   TEXT NOT NULL,
+                workspace_id TEXT,
+                role         TEXT,
+                msg_index    INTEGER,
+                ts           INTEGER,
+                content      TEXT,
+                title        TEXT,
+                project      TEXT
+            );
+            CREATE INDEX IF NOT EXISTS docs_session ON docs(session_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(
+                content, title, project,
+                content='docs', content_rowid='id', tokenize='{self.tokenizer}'
+            );
+            CREATE TABLE IF NOT EXISTS indexed_sessions (
+                session_id TEXT PRIMARY KEY,
+                digest     TEXT NOT NULL
+            );
+        """)
+        con.commit()
+        self._con = con
+        return con
+
+    def sync(self, store: SessionStore):
+        """Bring the index up to date with the session store."""
+        chats, versions, generation = store.snapshot()
+        with self._lock:
+            if generation == self._synced_generation:
+                return
+            con = self._connection()
+            indexed = dict(con.execute("SELECT session_id, digest FROM indexed_sessions"))
+            changed = [c for c in chats if indexed.get(c["session"]["composerId"]) != versions[c["session"]["composerId"]]]
+            removed = [cid for cid in indexed if cid not in versions]
+            if changed or removed:
+                start = time.perf_counter()
+                with con:
+                    for cid in removed + [c["session"]["composerId"] for c in changed]:
+                        self._delete(con, cid)
+                    for chat in changed:
+                        self._insert(con, chat, versions[chat["session"]["composerId"]])
+                logger.info(f"Search index: {len(changed)} sessions re-indexed, {len(removed)} removed "
+                            f"in {time.perf_counter() - start:.2f}s")
+            self._synced_generation = generation
+
+    @staticmethod
+    def _delete(con: sqlite3.Connection, session_id: str):
+        con.execute("""INSERT INTO search(search, rowid, content, title, project)
+                       SELECT 'delete', id, content, title, project FROM docs WHERE session_id=?""", (session_id,))
+        con.execute("DELETE FROM docs WHERE session_id=?", (session_id,))
+        con.execute("DELETE FROM indexed_sessions WHERE session_id=?", (session_id,))
+
+    @staticmethod
+    def _insert(con: sqlite3.Connection, chat: Dict[str, Any], digest: str):
+        session = chat["session"]
+        cid = session["composerId"]
+        ts = session.get("lastUpdatedAt") or session.get("createdAt")
+        title = session.get("title")
+        project = chat["project"].get("name")
+        for i, msg in enumerate(chat["messages"]):
+            cur = con.execute(
+                "INSERT INTO docs(session_id, workspace_id, role, msg_index, ts, content, title, project) "
+                "VALUES (?,?,?,?,?,?,?,?)",
+                (cid, chat.get("workspace_id"), msg["role"], i, ts, msg["content"], title, project))
+            con.execute("INSERT INTO search(rowid, content, title, project) VALUES (?,?,?,?)",
+                        (cur.lastrowid, msg["content"], title, project))
+        con.execute("INSERT OR REPLACE INTO indexed_sessions VALUES (?,?)", (cid, digest))
+
+    def search(self, query: str, project: Optional[str] = None, role: Optional[str] = None,
+               since: Optional[int] = None, until: Optional[int] = None, limit: int = 20) -> list[Dict[str, Any]]:
+        """
+        Return ranked message hits for `query`, best first.
+
+        `since` / `until` (ms) bound the session's last update, not the
+        individual message: every message of a session updated in the range
+        can match.
+        """
+        terms = query.split()
+        # Trigram matching needs at least three characters; shorter terms are
+        # applied as plain substring filters instead
+        min_len = 3 if self.tokenizer == "trigram" else 1
+        fts_terms = [t for t in terms if len(t) >= min_len]
+        like_terms = [t for t in terms if len(t) < min_len]
+
+        where, params = [], []
+        for t in like_terms:
+            where.append("(d.content LIKE ? ESCAPE '\\' OR d.title LIKE ? ESCAPE '\\')")
+            pattern = "%" + t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params += [pattern, pattern]
+        if project:
+            where.append("d.project = ? COLLATE NOCASE")
+            params.append(project)
+        if role:
+            where.append("d.role = ?")
+            params.append(role)
+        if since is not None:
+            where.append("d.ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("d.ts <= ?")
+            params.append(until)
+
+        if fts_terms:
+            # Quote every term so user input is never parsed as FTS5 syntax
+            match = " ".join('"' + t.replace('"', '""') + '"' for t in fts_terms)
+            sql = ("SELECT d.session_id, d.workspace_id, d.role, d.msg_index, d.ts, d.title, d.project, "
+                   "snippet(search, 0, '<mark>', '</mark>', '…', 16), bm25(search, 1.0, 4.0, 2.0) AS score "
+                   "FROM search JOIN docs d ON d.id = search.rowid WHERE search MATCH ?")
+            params.insert(0, match)
+            order = "score"
+        else:
+            sql = ("SELECT d.session_id, d.workspace_id, d.role, d.msg_index, d.ts, d.title, d.project, "
+                   "substr(d.content, 1, 160), 0 AS score FROM docs d WHERE 1")
+            order = "d.ts DESC"
+        if where:
+            sql += " AND " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+        return [{
+            "session_id": sid,
+            "workspace_id": ws_id,
+            "role": r,
+            "message_index": idx,
+            "last_updated": ts / 1000 if ts else None,
+            "title": title,
+            "project": proj,
+            "snippet": snippet,
+            "score": -score,
+        } for sid, ws_id, r, idx, ts, title, proj, snippet, score in rows]
+
+_search_index: Optional[SearchIndex] = None
+
+def search_index() -> SearchIndex:
+    """Return the process-wide search index, creating it on first use."""
+    global _search_index
+    with _chat_index_lock:
+        if _search_index is None:
+            _search_index = SearchIndex(cache_dir() / "search_index.sqlite")
+        return _search_index
+
+################################################################################
+# Storage change events
+################################################################################
+# Seconds between checks of the state.vscdb / -wal fingerprints
+WATCH_INTERVAL = float(os.environ.get("CURSOR_LIVE_WATCH_INTERVAL", "0.5"))
+# Seconds between SSE keep-alive comments on idle streams
+SSE_KEEPALIVE = 15.0
+
+def sidebar_hidden(db: pathlib.Path) -> Optional[bool]:
+    """Value of workbench.auxiliaryBar.hidden in a workspace DB (None if unreadable)."""
+    con = None
+    try:
+        con = sqlite_pool.connect(db)
+        hidden = j(con.cursor(), "ItemTable", "workbench.auxiliaryBar.hidden")
+        # 未设置时默认认为侧边栏是隐藏的
+        return hidden if hidden is not None else True
+    except sqlite3.DatabaseError as e:
+        logger.debug(f"Error reading sidebar state from {db}: {e}")
+        return None
+    finally:
+        if con is not None:
+            con.close()
+
+def session_event_data(chat: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact description of a session for change events."""
+    session = chat["session"]
+    last_updated = session.get("lastUpdatedAt")
+    return {
+        "session_id": session["composerId"],
+        "workspace_id": chat.get("workspace_id"),
+        "title": session.get("title"),
+        "last_updated": last_updated / 1000 if last_updated else None,
+        "message_count": len(chat["messages"]),
+    }
+
+class StorageWatcher:
+    """
+    Background thread that turns writes to Cursor's databases into events.
+
+    It polls the fingerprints of every workspace state.vscdb and the global
+    DB (including their -wal files). Changed sessions are found from the
+    global cursorDiskKV rows written since the last check and from composer
+    metadata of changed workspace DBs, then re-read one by one. The thread
+    only runs while someone is subscribed.
+
+    Events are dicts {"type": ..., "data": ...} with type one of
+    session_added, session_updated or sidebar_toggled.
+    """
+
+    def __init__(self, interval: float = WATCH_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscribers: list[queue.Queue] = []
+        self._thread: Optional[threading.Thread] = None
+        self._reset()
+
+    def _reset(self):
+        self._root: Optional[pathlib.Path] = None
+        self._fingerprints: Dict[str, Any] = {}
+        self._rowid = 0
+        self._sidebar: Dict[str, Optional[bool]] = {}
+        self._composers: Dict[str, Dict[str, Any]] = {}
+        self._known: set[str] = set()
+
+    def subscribe(self, maxsize: int = 1000) -> queue.Queue:
+        """Register a subscriber queue and make sure the watcher thread runs."""
+        q: queue.Queue = queue.Queue(maxsize=maxsize)
+        with self._lock:
+            self._subscribers.append(q)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="storage-watcher", daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def publish(self, event_type: str, data: Dict[str, Any]):
+        event = {"type": event_type, "data": data}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                logger.debug("Dropping storage event for a slow subscriber")
+
+    def _run(self):
+        logger.info("Storage watcher started")
+        self._reset()
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    break
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Storage watcher check failed: {e}", exc_info=True)
+            time.sleep(self.interval)
+        logger.info("Storage watcher stopped")
+
+    def check(self):
+        """Compare fingerprints with the previous check and publish what changed."""
+        root = cursor_root()
+        global_db = global_storage_path(root)
+        dbs = {ws_id: db for ws_id, db in workspaces(root)}
+        fingerprints = {str(db): db_fingerprint(db) for db in dbs.values()}
+        if global_db:
+            fingerprints[str(global_db)] = db_fingerprint(global_db)
+
+        if root != self._root:
+            # First check: remember the current state without publishing anything
+            self._rowid = sqlite_pool.with_retry(max_rowid, global_db) if global_db else 0
+            self._root = root
+            self._fingerprints = fingerprints
+            self._known = {c["session"]["composerId"] for c in session_store().chats()}
+            for ws_id, db in dbs.items():
+                self._sidebar[ws_id] = sidebar_hidden(db)
+                scan = chat_index().scan(db, "workspace", scan_workspace_db)
+                self._composers[ws_id] = scan["composers"] if scan else {}
+            return
+
+        changed_sessions: list[str] = []
+
+        def note(cid):
+            if cid not in changed_sessions:
+                changed_sessions.append(cid)
+
+        for ws_id, db in dbs.items():
+            key = str(db)
+            if fingerprints.get(key) == self._fingerprints.get(key):
+                continue
+            hidden = sidebar_hidden(db)
+            if ws_id in self._sidebar and hidden is not None and hidden != self._sidebar[ws_id]:
+                self.publish("sidebar_toggled", {"workspace_id": ws_id, "hidden": hidden})
+            self._sidebar[ws_id] = hidden
+
+            scan = chat_index().scan(db, "workspace", scan_workspace_db)
+            composers = scan["composers"] if scan else {}
+            previous = self._composers.get(ws_id, {})
+            for cid, meta in composers.items():
+                if previous.get(cid) != meta:
+                    note(cid)
+            self._composers[ws_id] = composers
+
+        if global_db and fingerprints.get(str(global_db)) != self._fingerprints.get(str(global_db)):
+            def read_changes():
+                rows = [(rowid, key) for rowid, key, _ in iter_disk_kv_since(global_db, self._rowid)]
+                return rows, (max_rowid(global_db) if not rows else None)
+            try:
+                rows, end = sqlite_pool.with_retry(read_changes)
+            except sqlite3.OperationalError as e:
+                if not sqlite_pool.is_contention(e):
+                    raise
+                # Still locked: keep the old fingerprint so the next check reads these rows
+                logger.debug(f"Global DB busy, checking it again next time: {e}")
+                fingerprints[str(global_db)] = self._fingerprints.get(str(global_db))
+            else:
+                top = self._rowid
+                for rowid, key in rows:
+                    top = max(top, rowid)
+                    cid = composer_id_from_key(key)
+                    if cid:
+                        note(cid)
+                if not rows and end < self._rowid:
+                    # The database was replaced; start over from its current end
+                    top = end
+                self._rowid = top
+
+        self._fingerprints = fingerprints
+        if not changed_sessions:
+            return
+        session_store().invalidate()
+        # One collection of the workspaces for every changed session
+        for cid, chat in chat_index().load_chats(root, changed_sessions):
+            if chat is None:
+                continue
+            event_type = "session_updated" if cid in self._known else "session_added"
+            self._known.add(cid)
+            self.publish(event_type, session_event_data(chat))
+
+_storage_watcher: Optional[StorageWatcher] = None
+
+def storage_watcher() -> StorageWatcher:
+    """Return the process-wide storage watcher."""
+    global _storage_watcher
+    with _chat_index_lock:
+        if _storage_watcher is None:
+            _storage_watcher = StorageWatcher()
+        return _storage_watcher
+
+def sse_format(event_type: str, data: Any) -> str:
+    """Encode one server-sent event."""
+    return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False, default=to_json_value)}\n\n"
+
+# Seconds to wait for a sent message to show up in the global DB, and between checks
+SEND_MATCH_TIMEOUT = 30.0
+SEND_MATCH_INTERVAL = 0.05
+
+def wait_for_sent_message(global_db: pathlib.Path, message: str, since_rowid: int,
+                          timeout: float = SEND_MATCH_TIMEOUT) -> Optional[str]:
+    """
+    Return the composerId whose user message `message` is written after `since_rowid`.
+
+    Only stat() runs until the DB changes; then just the cursorDiskKV rows
+    written since the last check are decoded, so a match is found within
+    one interval of Cursor saving the bubble. None on timeout.
+    """
+    message = message.strip()
+    fingerprint = None
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        current = db_fingerprint(global_db)
+        if current != fingerprint:
+            try:
+                rows = sqlite_pool.with_retry(
+                    lambda: list(iter_disk_kv_since(global_db, since_rowid, values=True)))
+            except sqlite3.OperationalError as e:
+                if not sqlite_pool.is_contention(e):
+                    raise
+                # Still locked: read the same rows on the next check
+                time.sleep(SEND_MATCH_INTERVAL)
+                continue
+            fingerprint = current
+            for rowid, k, v in rows:
+                since_rowid = max(since_rowid, rowid)
+                if k.startswith("bubbleId:"):
+                    found = bubble_message(k, v)
+                    if found is not None and found[2] == "user" and found[3] == message:
+                        return found[0]
+                elif k.startswith("composerData:") and v is not None:
+                    try:
+                        record = decode_composer(v)
+                    except Exception:
+                        continue
+                    if ["user", message] in ([role, text.strip()] for role, text, _ in conversation_messages(record)):
+                        return composer_id_from_key(k)
+        time.sleep(SEND_MATCH_INTERVAL)
+    return None
+
+################################################################################
+# Instrumentation
+################################################################################
+# Send each response's phase timings back in a Server-Timing header
+SERVER_TIMING = os.environ.get("CURSOR_LIVE_SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+HTTP_SECONDS = metrics.histogram("cursor_live_http_request_duration_seconds",
+                                 "Time to build a response (streamed bodies: until the headers)",
+                                 ("method", "endpoint", "status"))
+
+@app.before_request
+def start_request_timing():
+    request.environ["cursor_live.timing"] = (metrics.start_request(), time.perf_counter())
+
+@app.after_request
+def finish_request_timing(response):
+    """
+    Record the request duration and, with CURSOR_LIVE_SERVER_TIMING set,
+    add a Server-Timing header with the time spent per phase.
+
+    Registered before compress_response so compression is included.
+    """
+    started = request.environ.get("cursor_live.timing")
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started[1]
+    endpoint = request.url_rule.rule if request.url_rule is not None else "(unmatched)"
+    HTTP_SECONDS.observe(elapsed, method=request.method, endpoint=endpoint, status=response.status_code)
+    timings = metrics.current_request()
+    if SERVER_TIMING and timings is not None:
+        response.headers["Server-Timing"] = timings.server_timing(total=elapsed)
+    return response
+
+@app.teardown_request
+def reset_request_timing(exc=None):
+    started = request.environ.pop("cursor_live.timing", None)
+    if started is not None:
+        try:
+            metrics.finish_request(started[0])
+        except ValueError:
+            pass  # torn down from another context (e.g. after a streamed body)
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Counters and timers in the Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8",
+                    headers={"Cache-Control": "no-store"})
+
+################################################################################
+# Conditional responses
+################################################################################
+# Upper bound on remembered (request, source state) -> validator entries
+MAX_VALIDATORS = 4096
+
+# (request) -> (source state, etag, last modified, compressible, compressed if negotiated)
+_validators: Dict[tuple[str, bytes], tuple[str, str, datetime.datetime, bool, bool]] = {}
+_validators_lock = threading.Lock()
+
+def source_state(paths: Iterable[pathlib.Path]) -> tuple[str, datetime.datetime]:
+    """
+    Digest of the fingerprints of `paths` plus their latest modification time.
+
+    Only stat() calls: this is what lets an unchanged poll be answered
+    without opening any database.
+    """
+    h = hashlib.blake2b(digest_size=12)
+    latest = 0
+    for path in sorted(str(p) for p in paths):
+        fp = db_fingerprint(pathlib.Path(path))
+        h.update(f"{path}\0{fp}\0".encode("utf-8", "surrogatepass"))
+        if fp:
+            latest = max(latest, fp[1], fp[3])
+    modified = datetime.datetime.fromtimestamp(latest // 1_000_000_000, datetime.timezone.utc)
+    return h.hexdigest(), modified
+
+def all_sources(**_) -> list[pathlib.Path]:
+    """Every database chats are extracted from."""
+    root = cursor_root()
+    paths = [db for _, db in workspaces(root)]
+    global_db = global_storage_path(root)
+    if global_db:
+        paths.append(global_db)
+    return paths
+
+def chat_sources(session_id: str, **_) -> list[pathlib.Path]:
+    """
+    The databases one chat is built from: the workspaces listing it and the global DB.
+
+    Until an indexed workspace lists the chat, every source is used.
+    """
+    listed = chat_index().composer_workspaces(session_id)
+    if not listed:
+        return all_sources()
+    paths = [pathlib.Path(p) for p in listed]
+    global_db = global_storage_path(cursor_root())
+    if global_db:
+        paths.append(global_db)
+    return paths
+
+def workspace_sources(workspace_id: str, **_) -> list[pathlib.Path]:
+    return [cursor_root() / "User" / "workspaceStorage" / workspace_id / "state.vscdb"]
+
+def latest_session_sources(**_) -> list[pathlib.Path]:
+    root = cursor_root()
+    paths = workspace_sources(request.args.get('workspace_id', ''))
+    global_db = global_storage_path(root)
+    if global_db:
+        paths.append(global_db)
+    return paths
+
+def conditional(sources):
+    """
+    Add strong ETag / Last-Modified validators to a GET endpoint.
+
+    `sources(**view_args)` lists the databases the body is built from. The
+    ETag is a digest of the body, remembered against their fingerprints:
+    while those are unchanged, If-None-Match / If-Modified-Since get a 304
+    without running the view. When they change the view runs again, and a
+    body that came out identical (e.g. another chat was updated) still
+    gets a 304, with the Vary header and (weak) ETag compress_response()
+    gives the 200.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.path, request.query_string)
+            paths = sources(**kwargs)
+            state, modified = source_state(paths)
+            with _validators_lock:
+                known = _validators.get(key)
+            if known is not None and known[0] == state:
+                cached = Response(status=200)
+                cached.set_etag(known[1])
+                cached.last_modified = known[2]
+                cached.headers["Cache-Control"] = "no-cache"
+                cached.make_conditional(request)
+                if cached.status_code == 304:
+                    metrics.cache_lookup("validators", True)
+                    return not_modified_encoding(cached, known[3], known[4])
+            metrics.cache_lookup("validators", False)
+
+            # The sources moved on: make the store re-check them too. A key seen
+            # for the first time (a new page cursor or search) only does so if
+            # the store is behind its sources, so its validators match the body.
+            store = session_store()
+            if known[0] != state if known is not None else not store.covers(paths):
+                store.invalidate()
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            if response.is_streamed:
+                etag = hashlib.blake2b(repr((key, state)).encode(), digest_size=12).hexdigest()
+            else:
+                etag = hashlib.blake2b(response.get_data(), digest_size=16).hexdigest()
+            if known is not None and known[1] == etag:
+                modified = known[2]
+            # What compress_response() does to the 200, so a 304 can say the same
+            negotiable = compressible(response)
+            compressed = negotiable and (response.is_streamed or
+                                         len(response.get_data()) >= COMPRESS_MIN_SIZE)
+            with _validators_lock:
+                if len(_validators) >= MAX_VALIDATORS:
+                    _validators.clear()
+                _validators[key] = (state, etag, modified, negotiable, compressed)
+            response.set_etag(etag)
+            response.last_modified = modified
+            response.headers["Cache-Control"] = "no-cache"
+            if response.is_streamed:
+                # make_conditional() would buffer the whole body to set Content-Length
+                response.automatically_set_content_length = False
+            response = response.make_conditional(request)
+            if response.status_code == 304:
+                return not_modified_encoding(response, negotiable, compressed)
+            return response
+        return wrapper
+    return decorator
+
+################################################################################
+# Response compression
+################################################################################
+# brotli / zstandard are optional; gzip (zlib) is always available.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bodies smaller than this are sent as-is
+COMPRESS_MIN_SIZE = int(os.environ.get("CURSOR_LIVE_COMPRESS_MIN_SIZE", "1024"))
+# Budget for compressed bodies kept for repeated polls of unchanged content
+COMPRESS_CACHE_BYTES = 32 * 1024 * 1024
+COMPRESSIBLE_TYPES = ("application/json", "text/html")
+
+_compressed: "OrderedDict[tuple[str, str], bytes]" = OrderedDict()
+_compressed_size = 0
+_compressed_lock = threading.Lock()
+
+def compression_encodings() -> list[str]:
+    """Content-codings this process can produce, most preferred first."""
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+def compressor(encoding: str):
+    """Return (compress, flush) callables of a streaming compressor for `encoding`."""
+    if encoding == "br":
+        c = brotli.Compressor(quality=5)
+        return c.process, c.finish
+    if encoding == "zstd":
+        c = zstandard.ZstdCompressor(level=3).compressobj()
+        return c.compress, c.flush
+    c = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return c.compress, c.flush
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    compress, flush = compressor(encoding)
+    return compress(data) + flush()
+
+def compress_stream(chunks: Iterable[Any], encoding: str) -> Iterable[bytes]:
+    compress, flush = compressor(encoding)
+    for chunk in chunks:
+        out = compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if out:
+            yield out
+    yield flush()
+
+def cached_compress(key: str, data: bytes, encoding: str) -> bytes:
+    """compress_body() memoized by content key, within COMPRESS_CACHE_BYTES."""
+    global _compressed_size
+    with _compressed_lock:
+        body = _compressed.get((key, encoding))
+        if body is not None:
+            _compressed.move_to_end((key, encoding))
+        metrics.cache_lookup("compression", body is not None)
+        if body is not None:
+            return body
+    with metrics.timed("compress"):
+        body = compress_body(data, encoding)
+    with _compressed_lock:
+        if (key, encoding) not in _compressed:
+            _compressed[(key, encoding)] = body
+            _compressed_size += len(body)
+        while _compressed_size > COMPRESS_CACHE_BYTES and _compressed:
+            _, dropped = _compressed.popitem(last=False)
+            _compressed_size -= len(dropped)
+    return body
+
+def compressible(response) -> bool:
+    """Whether compress_response() negotiates a content-coding for this 200 response."""
+    return (not response.direct_passthrough and response.mimetype in COMPRESSIBLE_TYPES
+            and "Content-Encoding" not in response.headers)
+
+def not_modified_encoding(response, negotiable: bool, compressed: bool):
+    """
+    Give a 304 the Vary header and ETag the 200 it stands in for would carry:
+    Vary: Accept-Encoding when the coding is negotiated, and the weak ETag
+    when the client's Accept-Encoding would get a compressed body.
+    """
+    if not negotiable:
+        return response
+    response.vary.add("Accept-Encoding")
+    if compressed and request.accept_encodings.best_match(compression_encodings()) is not None:
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """
+    Negotiate gzip / br / zstd for JSON and HTML bodies.
+
+    Buffered bodies above COMPRESS_MIN_SIZE are compressed once per content
+    (keyed by ETag or a body digest) and reused; streamed bodies are
+    compressed chunk by chunk. Event streams are left alone.
+    """
+    if response.status_code != 200 or not compressible(response):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(compression_encodings())
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        etag, weak = response.get_etag()
+        key = etag or hashlib.blake2b(data, digest_size=16).hexdigest()
+        response.set_data(cached_compress(key, data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # Same validator for every encoding, so it can only be a weak one
+        response.set_etag(etag, weak=True)
+    return response
+
+################################################################################
+# Automation jobs
+################################################################################
+# Finished jobs kept for /api/jobs/<id>, and the longest a request may wait on one
+MAX_FINISHED_JOBS = 200
+MAX_JOB_WAIT = 60.0
+
+class Job:
+    """
+    One queued GUI automation action and, once it ran, its result.
+
+    `released_at` is when the action let go of the GUI; a job whose action
+    left work that does not touch the GUI stays running until that is done.
+    """
+    __slots__ = ("id", "kind", "fn", "args", "status", "created_at", "started_at",
+                 "released_at", "finished_at", "result", "status_code")
+
+    def __init__(self, kind: str, fn, args: tuple):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.released_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.status_code: Optional[int] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "released_at": self.released_at,
+            "finished_at": self.finished_at,
+            "status_code": self.status_code,
+            "result": self.result,
+        }
+
+class JobQueue:
+    """
+    Runs automation actions one at a time on a dedicated worker thread.
+
+    pyautogui drives the one Cursor window, so actions must not overlap;
+    request threads only enqueue and, if asked to, wait for the result.
+    An action returns (payload, status_code), or (payload, status_code,
+    follow_up) when the rest of its work does not need the GUI: follow_up()
+    then runs on its own thread and returns the job's final (payload,
+    status_code), while the worker moves on to the next action.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending: "queue.Queue[Job]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, kind: str, fn, *args) -> Job:
+        job = Job(kind, fn, args)
+        with self._cond:
+            self._jobs[job.id] = job
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="automation-jobs", daemon=True)
+                self._thread.start()
+        self._pending.put(job)
+        logger.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def wait(self, job: Job, timeout: float) -> bool:
+        """Block until `job` finished or `timeout` seconds passed; return whether it finished."""
+        with self._cond:
+            return self._cond.wait_for(lambda: job.done, timeout)
+
+    def _run(self):
+        while True:
+            job = self._pending.get()
+            with self._cond:
+                job.status = "running"
+                job.started_at = time.time()
+            follow_up = None
+            try:
+                outcome = job.fn(*job.args)
+                result, status_code = outcome[:2]
+                if len(outcome) > 2:
+                    follow_up = outcome[2]
+            except Exception as e:
+                logger.error(f"Error in {job.kind} job {job.id}: {e}", exc_info=True)
+                result, status_code = {"success": False, "error": str(e)}, 500
+            with self._cond:
+                job.released_at = time.time()
+            if follow_up is None:
+                self._finish(job, result, status_code)
+            else:
+                threading.Thread(target=self._follow_up, args=(job, follow_up),
+                                 name=f"automation-{job.kind}", daemon=True).start()
+
+    def _follow_up(self, job: Job, follow_up):
+        try:
+            result, status_code = follow_up()
+        except Exception as e:
+            logger.error(f"Error in {job.kind} job {job.id}: {e}", exc_info=True)
+            result, status_code = {"success": False, "error": str(e)}, 500
+        self._finish(job, result, status_code)
+
+    def _finish(self, job: Job, result: Dict[str, Any], status_code: int):
+        with self._cond:
+            job.result = result
+            job.status_code = status_code
+            job.status = "succeeded" if status_code < 400 else "failed"
+            job.finished_at = time.time()
+            self._forget_old()
+            self._cond.notify_all()
+        logger.info(f"{job.kind} job {job.id} {job.status} in {job.finished_at - job.started_at:.1f}s")
+
+    def _forget_old(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+_job_queue: Optional[JobQueue] = None
+
+def job_queue() -> JobQueue:
+    """Return the process-wide automation job queue."""
+    global _job_queue
+    with _chat_index_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
+
+def requested_wait() -> float:
+    """Seconds the client asked to wait for a job (`?wait=`), capped at MAX_JOB_WAIT."""
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        wait = 0.0
+    return min(max(wait, 0.0), MAX_JOB_WAIT)
+
+def job_response(kind: str, fn, *args):
+    """
+    Enqueue an automation action and answer for it.
+
+    Returns 202 with the job (and a Location to poll) right away. With
+    `?wait=N` the request blocks up to N seconds, and a finished action is
+    answered with its own body and status as before.
+    """
+    jobs = job_queue()
+    job = jobs.submit(kind, fn, *args)
+    wait = requested_wait()
+    if wait and jobs.wait(job, wait):
+        return jsonify(job.result), job.status_code
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return response
+
 ################################################################################
 # Extraction pipeline
 ################################################################################
@@ -422,7 +2977,7 @@ def extract_chats() -> list[Dict[str,Any]]:
             if first_ws:
                 ws_id, db = first_ws
                 logger.debug(f"\n--- DIAGNOSTICS for workspace {ws_id} ---")
-                con = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+                con = sqlite_pool.connect(db)
                 cur = con.cursor()
                 
                 # List all tables
@@ -444,7 +2999,7 @@ def extract_chats() -> list[Dict[str,Any]]:
             global_db = global_storage_path(root)
             if global_db:
                 logger.debug(f"\n--- DIAGNOSTICS for global storage ---")
-                con = sqlite3.connect(f"file:{global_db}?mode=ro", uri=True)
+                con = sqlite_pool.connect(global_db)
                 cur = con.cursor()
                 
                 # List all tables
@@ -472,155 +3027,8 @@ def extract_chats() -> list[Dict[str,Any]]:
         except Exception as e:
             logger.debug(f"Error in diagnostics: {e}")
 
-    # map lookups
-    ws_proj  : Dict[str,Dict[str,Any]] = {}
-    comp_meta: Dict[str,Dict[str,Any]] = {}
-    comp2ws  : Dict[str,str]           = {}
-    sessions : Dict[str,Dict[str,Any]] = defaultdict(lambda: {"messages":[]})
-
-    # 1. Process workspace DBs first
-    logger.debug("Processing workspace databases...")
-    ws_count = 0
-    for ws_id, db in workspaces(root):
-        ws_count += 1
-        logger.debug(f"Processing workspace {ws_id} - {db}")
-        proj, meta = workspace_info(db)
-        ws_proj[ws_id] = proj
-        for cid, m in meta.items():
-            comp_meta[cid] = m
-            comp2ws[cid] = ws_id
-        
-        # Extract chat data from workspace's state.vscdb
-        msg_count = 0
-        for cid, role, text, db_path in iter_chat_from_item_table(db):
-            # Add the message
-            sessions[cid]["messages"].append({"role": role, "content": text})
-            # Make sure to record the database path
-            if "db_path" not in sessions[cid]:
-                sessions[cid]["db_path"] = db_path
-            msg_count += 1
-            if cid not in comp_meta:
-                comp_meta[cid] = {"title": f"Chat {cid[:8]}", "createdAt": None, "lastUpdatedAt": None}
-                comp2ws[cid] = ws_id
-        logger.debug(f"  - Extracted {msg_count} messages from workspace {ws_id}")
-    
-    logger.debug(f"Processed {ws_count} workspaces")
-
-    # 2. Process global storage
-    global_db = global_storage_path(root)
-    if global_db:
-        logger.debug(f"Processing global storage: {global_db}")
-        # Extract bubbles from cursorDiskKV
-        msg_count = 0
-        for cid, role, text, db_path in iter_bubbles_from_disk_kv(global_db):
-            sessions[cid]["messages"].append({"role": role, "content": text})
-            # Record the database path
-            if "db_path" not in sessions[cid]:
-                sessions[cid]["db_path"] = db_path
-            msg_count += 1
-            if cid not in comp_meta:
-                comp_meta[cid] = {"title": f"Chat {cid[:8]}", "createdAt": None, "lastUpdatedAt": None}
-                comp2ws[cid] = "(global)"
-        logger.debug(f"  - Extracted {msg_count} messages from global cursorDiskKV bubbles")
-        
-        # Extract composer data
-        comp_count = 0
-        for cid, data, db_path in iter_composer_data(global_db):
-            if cid not in comp_meta:
-                created_at = data.get("createdAt")
-                comp_meta[cid] = {
-                    "title": f"Chat {cid[:8]}",
-                    "createdAt": created_at,
-                    "lastUpdatedAt": created_at
-                }
-                comp2ws[cid] = "(global)"
-            
-            # Record the database path
-            if "db_path" not in sessions[cid]:
-                sessions[cid]["db_path"] = db_path
-                
-            # Extract conversation from composer data
-            conversation = data.get("conversation", [])
-            if conversation:
-                msg_count = 0
-                for msg in conversation:
-                    msg_type = msg.get("type")
-                    if msg_type is None:
-                        continue
-                    
-                    # Type 1 = user, Type 2 = assistant
-                    role = "user" if msg_type == 1 else "assistant"
-                    content = msg.get("text", "")
-                    if content and isinstance(content, str):
-                        sessions[cid]["messages"].append({"role": role, "content": content})
-                        msg_count += 1
-                
-                if msg_count > 0:
-                    comp_count += 1
-                    logger.debug(f"  - Added {msg_count} messages from composer {cid[:8]}")
-        
-        if comp_count > 0:
-            logger.debug(f"  - Extracted data from {comp_count} composers in global cursorDiskKV")
-        
-        # Also try ItemTable in global DB
-        try:
-            con = sqlite3.connect(f"file:{global_db}?mode=ro", uri=True)
-            chat_data = j(con.cursor(), "ItemTable", "workbench.panel.aichat.view.aichat.chatdata")
-            if chat_data:
-                msg_count = 0
-                for tab in chat_data.get("tabs", []):
-                    tab_id = tab.get("tabId")
-                    if tab_id and tab_id not in comp_meta:
-                        comp_meta[tab_id] = {
-                            "title": f"Global Chat {tab_id[:8]}",
-                            "createdAt": None,
-                            "lastUpdatedAt": None
-                        }
-                        comp2ws[tab_id] = "(global)"
-                    
-                    for bubble in tab.get("bubbles", []):
-                        content = ""
-                        if "text" in bubble:
-                            content = bubble["text"]
-                        elif "content" in bubble:
-                            content = bubble["content"]
-                        
-                        if content and isinstance(content, str):
-                            role = "user" if bubble.get("type") == "user" else "assistant"
-                            sessions[tab_id]["messages"].append({"role": role, "content": content})
-                            msg_count += 1
-                logger.debug(f"  - Extracted {msg_count} messages from global chat data")
-            con.close()
-        except Exception as e:
-            logger.debug(f"Error processing global ItemTable: {e}")
-
-    # 3. Build final list
-    out = []
-    for cid, data in sessions.items():
-        if not data["messages"]:
-            continue
-        ws_id = comp2ws.get(cid, "(unknown)")
-        project = ws_proj.get(ws_id, {"name": "(unknown)", "rootPath": "(unknown)"})
-        meta = comp_meta.get(cid, {"title": "(untitled)", "createdAt": None, "lastUpdatedAt": None})
-        
-        # Create the output object with the db_path included
-        chat_data = {
-            "project": project,
-            "session": {"composerId": cid, **meta},
-            "messages": data["messages"],
-            "workspace_id": ws_id,
-        }
-        
-        # Add the database path if available
-        if "db_path" in data:
-            chat_data["db_path"] = data["db_path"]
-            
-        out.append(chat_data)
-    
-    # Sort by last updated time if available
-    out.sort(key=lambda s: s["session"].get("lastUpdatedAt") or 0, reverse=True)
-    logger.debug(f"Total chat sessions extracted: {len(out)}")
-    return out
+    # Served from the session store, backed by the persistent index
+    return session_store().chats()
 
 def get_latest_session_id(workspace_id: str) -> Optional[Dict[str, Any]]:
     """
@@ -643,159 +3051,45 @@ def get_latest_session_id(workspace_id: str) -> Optional[Dict[str, Any]]:
     
     root = cursor_root()
     logger.debug(f"Looking for latest session in workspace: {workspace_id}")
-    
-    # 使用与 extract_chats 相同的逻辑来构建映射
-    comp2ws: Dict[str, str] = {}
-    comp_meta: Dict[str, Dict[str, Any]] = {}
-    sessions: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"messages": [], "last_updated": 0})
-    
-    # 1. 处理工作区数据库
-    workspace_db = None
-    found_ws_id = None
-    for ws_id, db in workspaces(root):
-        if ws_id == workspace_id:
-            workspace_db = db
-            found_ws_id = ws_id
-            break
-    
-    if workspace_db and found_ws_id:
-        logger.debug(f"Processing workspace DB: {workspace_db}")
-        # 获取工作区信息
-        proj, meta = workspace_info(workspace_db)
-        for cid, m in meta.items():
-            comp_meta[cid] = m
-            comp2ws[cid] = found_ws_id
-
-        # 从工作区数据库提取聊天数据
-        msg_count = 0
-        for cid, role, text, db_path in iter_chat_from_item_table(workspace_db):
-            sessions[cid]["messages"].append({"role": role, "content": text})
-            if cid not in comp_meta:
-                comp_meta[cid] = {"title": f"Chat {cid[:8]}", "createdAt": None, "lastUpdatedAt": None}
-            if cid not in comp2ws:
-                comp2ws[cid] = found_ws_id
-            msg_count += 1
-        logger.debug(f"  - Extracted {msg_count} messages from workspace {workspace_id}")
-    
-    # 2. 处理全局存储
+
+    workspace_db = root / "User" / "workspaceStorage" / workspace_id / "state.vscdb"
+    index = chat_index()
+    # 维护中的 composer→工作区 索引：只取该工作区的候选会话（已按最后更新时间从新到旧排序）
+    indexed = index.workspace_composers(workspace_db)
+    if indexed is None:
+        logger.debug(f"No sessions found in workspace {workspace_id}")
+        return None
+    scan, candidates = indexed
+
     global_db = global_storage_path(root)
-    if global_db:
-        logger.debug(f"Processing global storage: {global_db}")
-        
-        # 提取 bubbles from cursorDiskKV
-        msg_count = 0
-        for cid, role, text, db_path in iter_bubbles_from_disk_kv(global_db):
-            sessions[cid]["messages"].append({"role": role, "content": text})
-            msg_count += 1
-            if cid not in comp_meta:
-                comp_meta[cid] = {"title": f"Chat {cid[:8]}", "createdAt": None, "lastUpdatedAt": None}
-            if cid not in comp2ws:
-                comp2ws[cid] = "(global)"
-        logger.debug(f"  - Extracted {msg_count} messages from global cursorDiskKV bubbles")
-
-        # 提取 composer 数据
-        comp_count = 0
-        for cid, data, db_path in iter_composer_data(global_db):
-            if cid not in comp_meta:
-                created_at = data.get("createdAt")
-                comp_meta[cid] = {
-                    "title": f"Chat {cid[:8]}",
-                    "createdAt": created_at,
-                    "lastUpdatedAt": created_at
-                }
-            if cid not in comp2ws:
-                comp2ws[cid] = "(global)"
-            
-            # 提取对话数据
-            conversation = data.get("conversation", [])
-            if conversation:
-                msg_count = 0
-                for msg in conversation:
-                    msg_type = msg.get("type")
-                    if msg_type is not None:
-                        role = "user" if msg_type == 1 else "assistant"
-                        content = msg.get("text", "")
-                        if content and isinstance(content, str):
-                            sessions[cid]["messages"].append({"role": role, "content": content})
-                            msg_count += 1
-                
-                if msg_count > 0:
-                    comp_count += 1
-                    logger.debug(f"  - Added {msg_count} messages from composer {cid[:8]}")
-        
-        if comp_count > 0:
-            logger.debug(f"  - Extracted data from {comp_count} composers in global cursorDiskKV")
-        
-        # 处理全局 ItemTable
-        try:
-            con = sqlite3.connect(f"file:{global_db}?mode=ro", uri=True)
-            chat_data = j(con.cursor(), "ItemTable", "workbench.panel.aichat.view.aichat.chatdata")
-            if chat_data:
-                msg_count = 0
-                for tab in chat_data.get("tabs", []):
-                    tab_id = tab.get("tabId")
-                    if tab_id and tab_id not in comp_meta:
-                        comp_meta[tab_id] = {
-                            "title": f"Global Chat {tab_id[:8]}",
-                            "createdAt": None,
-                            "lastUpdatedAt": None
-                        }
-                    if tab_id and tab_id not in comp2ws:
-                        comp2ws[tab_id] = "(global)"
-                    
-                    for bubble in tab.get("bubbles", []):
-                        content = ""
-                        if "text" in bubble:
-                            content = bubble["text"]
-                        elif "content" in bubble:
-                            content = bubble["content"]
-                        
-                        if content and isinstance(content, str):
-                            role = "user" if bubble.get("type") == "user" else "assistant"
-                            sessions[tab_id]["messages"].append({"role": role, "content": content})
-                            msg_count += 1
-                logger.debug(f"  - Extracted {msg_count} messages from global chat data")
-            con.close()
-        except Exception as e:
-            logger.debug(f"Error processing global ItemTable: {e}")
-    
-    # 3. 筛选属于指定工作区的会话
-    workspace_sessions = {}
-    for cid, data in sessions.items():
-        if comp2ws.get(cid) == workspace_id and data["messages"]:
-            workspace_sessions[cid] = data
-    
-    logger.debug(f"Found {len(workspace_sessions)} sessions for workspace {workspace_id}")
-    
-    # 4. 找到最新的会话（按照最后更新时间排序）
+
+    def load_messages(cid):
+        # 与列表/单会话查询共用同一份已物化的索引状态，只按需读取该会话自己的全局数据
+        chat = index.composer_chat([(workspace_id, str(workspace_db), scan)], global_db, cid)
+        return chat["messages"] if chat else []
+
+    # 按最后更新时间从新到旧检查，第一个有消息的会话即为最新会话
     latest_session_id = None
     latest_messages = []
     latest_update_time = 0
-    message_count = 0
-
-    for cid, data in workspace_sessions.items():
-        # 获取最后更新时间
-        meta = comp_meta.get(cid, {})
-        last_updated = meta.get("lastUpdatedAt") or meta.get("createdAt") or 0
-
-        # 如果时间戳是字符串，尝试转换为数字
-        if isinstance(last_updated, str):
-            try:
-                last_updated = float(last_updated)
-            except ValueError:
-                last_updated = 0
-
-        # 如果时间戳为0，使用消息数量作为备用排序
-        if last_updated == 0:
-            last_updated = len(data["messages"])
+    for cid, last_updated in candidates:
+        if not last_updated:
+            break
+        messages = load_messages(cid)
+        if messages:
+            latest_session_id, latest_messages, latest_update_time = cid, messages, last_updated
+            break
 
-        # 比较时间戳，找到最新的
-        if last_updated > latest_update_time:
-            latest_update_time = last_updated
-            latest_session_id = cid
-            latest_messages = data["messages"]
-            message_count = len(data["messages"])
+    # 没有时间戳的会话使用消息数量作为备用排序
+    if latest_session_id is None:
+        for cid, last_updated in candidates:
+            if last_updated:
+                continue
+            messages = load_messages(cid)
+            if len(messages) > latest_update_time:
+                latest_session_id, latest_messages, latest_update_time = cid, messages, len(messages)
 
+    message_count = len(latest_messages)
     if latest_session_id:
         logger.debug(f"Found latest session {latest_session_id} with {message_count} messages (updated: {latest_update_time}) in workspace {workspace_id}")
         return {
@@ -831,7 +3125,7 @@ def extract_project_from_git_repos(workspace_id, debug=False):
         # Connect to the workspace DB
         if debug:
             logger.debug(f"Connecting to workspace DB: {workspace_db_path}")
-        con = sqlite3.connect(f"file:{workspace_db_path}?mode=ro", uri=True)
+        con = sqlite_pool.connect(workspace_db_path)
         cur = con.cursor()
         
         # Look for git repositories
@@ -885,89 +3179,102 @@ def extract_project_from_git_repos(workspace_id, debug=False):
         
     return None
 
+def frontend_project(chat, git_names: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+    """
+    The chat's project as the frontend shows it: a readable name, a rootPath
+    and the workspace_id. `git_names` memoizes the git-repository fallback
+    per workspace, e.g. across one listing.
+    """
+    # Ensure project has expected fields
+    # Copy: chats are shared with the session store
+    project = chat.get('project', {})
+    project = dict(project) if isinstance(project, dict) else {}
+
+    # Get workspace_id from chat
+    workspace_id = chat.get('workspace_id', 'unknown')
+
+    # If project name is a username or unknown, try to extract a better name from rootPath
+    if project.get('rootPath'):
+        current_name = project.get('name', '')
+        username = os.path.basename(os.path.expanduser('~'))
+
+        # Check if project name is username or unknown or very generic
+        root_path = project.get('rootPath')
+        if (current_name == username or 
+            current_name == '(unknown)' or 
+            current_name == 'Root' or
+            # Check if rootPath is directly under /Users/username with no additional path components
+            (root_path is not None and 
+             root_path.startswith(f'/Users/{username}') and 
+             root_path.count('/') <= 3)):
+
+            # Try to extract a better name from the path
+            root_path = project.get('rootPath')
+            if root_path is not None:
+                project_name = extract_project_name_from_path(root_path, debug=False)
+
+                # Only use the new name if it's meaningful
+                if (project_name and 
+                    project_name != 'Unknown Project' and 
+                    project_name != username and
+                    project_name not in ['Documents', 'Downloads', 'Desktop']):
+
+                    logger.debug(f"Improved project name from '{current_name}' to '{project_name}'")
+                    project['name'] = project_name
+                elif root_path.startswith(f'/Users/{username}/Documents/codebase/'):
+                    # Special case for /Users/saharmor/Documents/codebase/X
+                    parts = root_path.split('/')
+                    if len(parts) > 5:  # /Users/username/Documents/codebase/X
+                        project['name'] = parts[5]
+                        logger.debug(f"Set project name to specific codebase subdirectory: {parts[5]}")
+                    else:
+                        project['name'] = "cursor-view"  # Current project as default
+
+    # If the project doesn't have a rootPath or it's very generic, enhance it with workspace_id
+    if not project.get('rootPath') or project.get('rootPath') == '/' or project.get('rootPath') == '/Users':
+        if workspace_id != 'unknown':
+            # Use workspace_id to create a more specific path
+            if not project.get('rootPath'):
+                project['rootPath'] = f"/workspace/{workspace_id}"
+            elif project.get('rootPath') == '/' or project.get('rootPath') == '/Users':
+                project['rootPath'] = f"{project['rootPath']}/workspace/{workspace_id}"
+
+    # FALLBACK: If project name is still generic, try to extract it from git repositories
+    if project.get('name') in ['Home Directory', '(unknown)']:
+        if git_names is None:
+            git_project_name = extract_project_from_git_repos(workspace_id, debug=True)
+        else:
+            if workspace_id not in git_names:
+                git_names[workspace_id] = extract_project_from_git_repos(workspace_id, debug=True)
+            git_project_name = git_names[workspace_id]
+        if git_project_name:
+            logger.debug(f"Improved project name from '{project.get('name')}' to '{git_project_name}' using git repo")
+            project['name'] = git_project_name
+
+    # Add workspace_id to the project data explicitly
+    project['workspace_id'] = workspace_id
+    return project
+
+def chat_date(chat) -> float:
+    """createdAt of the chat in seconds, or now if it has none."""
+    session = chat.get('session')
+    if session and isinstance(session, dict):
+        created_at = session.get('createdAt')
+        if created_at and isinstance(created_at, (int, float)):
+            # Convert from milliseconds to seconds
+            return created_at / 1000
+    return int(datetime.datetime.now().timestamp())
+
+def chat_session_id(chat) -> str:
+    """composerId of the chat, or a fresh unique ID if it has none."""
+    session = chat.get('session')
+    if session and isinstance(session, dict) and session.get('composerId'):
+        return session['composerId']
+    return str(uuid.uuid4())
+
 def format_chat_for_frontend(chat):
     """Format the chat data to match what the frontend expects."""
     try:
-        # Generate a unique ID for this chat if it doesn't have one
-        session_id = str(uuid.uuid4())
-        if 'session' in chat and chat['session'] and isinstance(chat['session'], dict):
-            session_id = chat['session'].get('composerId', session_id)
-        
-        # Format date from createdAt timestamp or use current date
-        date = int(datetime.datetime.now().timestamp())
-        if 'session' in chat and chat['session'] and isinstance(chat['session'], dict):
-            created_at = chat['session'].get('createdAt')
-            if created_at and isinstance(created_at, (int, float)):
-                # Convert from milliseconds to seconds
-                date = created_at / 1000
-        
-        # Ensure project has expected fields
-        project = chat.get('project', {})
-        if not isinstance(project, dict):
-            project = {}
-            
-        # Get workspace_id from chat
-        workspace_id = chat.get('workspace_id', 'unknown')
-        
-        # Get the database path information
-        db_path = chat.get('db_path', 'Unknown database path')
-        
-        # If project name is a username or unknown, try to extract a better name from rootPath
-        if project.get('rootPath'):
-            current_name = project.get('name', '')
-            username = os.path.basename(os.path.expanduser('~'))
-            
-            # Check if project name is username or unknown or very generic
-            root_path = project.get('rootPath')
-            if (current_name == username or 
-                current_name == '(unknown)' or 
-                current_name == 'Root' or
-                # Check if rootPath is directly under /Users/username with no additional path components
-                (root_path is not None and 
-                 root_path.startswith(f'/Users/{username}') and 
-                 root_path.count('/') <= 3)):
-                
-                # Try to extract a better name from the path
-                root_path = project.get('rootPath')
-                if root_path is not None:
-                    project_name = extract_project_name_from_path(root_path, debug=False)
-                    
-                    # Only use the new name if it's meaningful
-                    if (project_name and 
-                        project_name != 'Unknown Project' and 
-                        project_name != username and
-                        project_name not in ['Documents', 'Downloads', 'Desktop']):
-                        
-                        logger.debug(f"Improved project name from '{current_name}' to '{project_name}'")
-                        project['name'] = project_name
-                    elif root_path.startswith(f'/Users/{username}/Documents/codebase/'):
-                        # Special case for /Users/saharmor/Documents/codebase/X
-                        parts = root_path.split('/')
-                        if len(parts) > 5:  # /Users/username/Documents/codebase/X
-                            project['name'] = parts[5]
-                            logger.debug(f"Set project name to specific codebase subdirectory: {parts[5]}")
-                        else:
-                            project['name'] = "cursor-view"  # Current project as default
-        
-        # If the project doesn't have a rootPath or it's very generic, enhance it with workspace_id
-        if not project.get('rootPath') or project.get('rootPath') == '/' or project.get('rootPath') == '/Users':
-            if workspace_id != 'unknown':
-                # Use workspace_id to create a more specific path
-                if not project.get('rootPath'):
-                    project['rootPath'] = f"/workspace/{workspace_id}"
-                elif project.get('rootPath') == '/' or project.get('rootPath') == '/Users':
-                    project['rootPath'] = f"{project['rootPath']}/workspace/{workspace_id}"
-        
-        # FALLBACK: If project name is still generic, try to extract it from git repositories
-        if project.get('name') in ['Home Directory', '(unknown)']:
-            git_project_name = extract_project_from_git_repos(workspace_id, debug=True)
-            if git_project_name:
-                logger.debug(f"Improved project name from '{project.get('name')}' to '{git_project_name}' using git repo")
-                project['name'] = git_project_name
-        
-        # Add workspace_id to the project data explicitly
-        project['workspace_id'] = workspace_id
-            
         # Ensure messages exist and are properly formatted
         messages = chat.get('messages', [])
         if not isinstance(messages, list):
@@ -975,12 +3282,12 @@ def format_chat_for_frontend(chat):
         
         # Create properly formatted chat object
         return {
-            'project': project,
+            'project': frontend_project(chat),
             'messages': messages,
-            'date': date,
-            'session_id': session_id,
-            'workspace_id': workspace_id,
-            'db_path': db_path  # Include the database path in the output
+            'date': chat_date(chat),
+            'session_id': chat_session_id(chat),
+            'workspace_id': chat.get('workspace_id', 'unknown'),
+            'db_path': chat.get('db_path', 'Unknown database path')  # Include the database path in the output
         }
     except Exception as e:
         logger.error(f"Error formatting chat: {e}")
@@ -994,51 +3301,353 @@ def format_chat_for_frontend(chat):
             'db_path': 'Error retrieving database path'
         }
 
+# Characters of the first user message included in chat summaries
+PREVIEW_CHARS = 200
+
+# Page sizes for /api/chats?limit=
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def format_chat_summary(chat, git_names: Optional[Dict[str, Optional[str]]] = None):
+    """
+    Format a chat for listings: the fields of format_chat_for_frontend()
+    except the messages, plus title, last update, message count and a short
+    preview of the first user message. Built from the session and project
+    fields without touching the message list beyond the first user message.
+    """
+    session = chat.get('session') if isinstance(chat.get('session'), dict) else {}
+    messages = chat.get('messages')
+    if not isinstance(messages, list):
+        messages = []
+
+    first = next((m for m in messages if m.get('role') == 'user'), messages[0] if messages else None)
+    preview = first.get('content', '') if first else ''
+    if not isinstance(preview, str):
+        preview = ''
+    if len(preview) > PREVIEW_CHARS:
+        preview = preview[:PREVIEW_CHARS] + '...'
+
+    last_updated = session.get('lastUpdatedAt')
+    return {
+        'project': frontend_project(chat, git_names),
+        'date': chat_date(chat),
+        'session_id': chat_session_id(chat),
+        'workspace_id': chat.get('workspace_id', 'unknown'),
+        'db_path': chat.get('db_path', 'Unknown database path'),
+        'title': session.get('title'),
+        'last_updated': last_updated / 1000 if isinstance(last_updated, (int, float)) else None,
+        'message_count': len(messages),
+        'preview': preview,
+    }
+
+# Seconds a client is told to wait after a read lost to Cursor's write lock
+BUSY_RETRY_AFTER = int(os.environ.get("CURSOR_LIVE_BUSY_RETRY_AFTER", "1"))
+
+def busy_response(e: Exception):
+    """503 with Retry-After for a read that still hit Cursor's write lock after retrying."""
+    logger.warning(f"Cursor database busy: {e}")
+    response = jsonify({"error": "Cursor database is busy, retry shortly"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(BUSY_RETRY_AFTER)
+    return response
+
 @app.route('/api/chats', methods=['GET'])
+@conditional(all_sources)
 def get_chats():
-    """Get all chat sessions."""
+    """
+    Get all chat sessions.
+
+    With `?summary=1` each chat carries title, dates, message_count and a
+    preview instead of its messages; fetch bodies via /api/chat/<session_id>.
+
+    With `?limit=N` (and `cursor=` from the previous page) the response is
+    {"items": [...], "next_cursor": ..., "total": ...}, newest first.
+    """
     try:
         logger.info(f"Received request for chats from {request.remote_addr}")
-        chats = extract_chats()
-        logger.info(f"Retrieved {len(chats)} chats")
-        
-        # Format each chat for the frontend
-        formatted_chats = []
-        for chat in chats:
+        summary = request.args.get('summary', '').lower() in ('1', 'true', 'yes')
+        # Summaries resolve a workspace's git-repository project name once per listing
+        formatter = (functools.partial(format_chat_summary, git_names={}) if summary
+                     else format_chat_for_frontend)
+
+        paged = 'limit' in request.args or 'cursor' in request.args
+        if paged:
             try:
-                formatted_chat = format_chat_for_frontend(chat)
-                formatted_chats.append(formatted_chat)
-            except Exception as e:
-                logger.error(f"Error formatting individual chat: {e}")
-                # Skip this chat if it can't be formatted
-                continue
-        
-        logger.info(f"Returning {len(formatted_chats)} formatted chats")
-        return jsonify(formatted_chats)
+                limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+                if limit < 1:
+                    raise ValueError(limit)
+                chats, next_cursor, total = session_store().page(min(limit, MAX_PAGE_SIZE),
+                                                                 request.args.get('cursor'))
+            except ValueError as e:
+                return jsonify({"error": f"Invalid pagination parameters: {e}"}), 400
+        else:
+            chats = extract_chats()
+        logger.info(f"Retrieved {len(chats)} chats")
+
+        envelope = ({"next_cursor": next_cursor, "total": total} if paged else None)
+        return Response(stream_chat_list(chats, formatter, envelope), mimetype="application/json")
     except Exception as e:
+        if sqlite_pool.is_contention(e):
+            return busy_response(e)
         logger.error(f"Error in get_chats: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+def encode_json(obj) -> str:
+    """Encode like jsonify() does (app JSON settings, compact separators)."""
+    return app.json.dumps(obj, separators=(",", ":"))
+
+def stream_chat_list(chats, formatter, envelope=None) -> Iterable[str]:
+    """
+    Yield the JSON array of formatted chats one chat at a time.
+
+    Only one formatted chat and its encoding are alive at once, so memory
+    and time to first byte do not grow with the history. With `envelope`
+    the array is wrapped as {"items": [...], **envelope}.
+    """
+    yield '{"items":[' if envelope is not None else "["
+    count = 0
+    formatting = encoding = 0.0
+    clock = time.perf_counter
+    for chat in chats:
+        try:
+            start = clock()
+            formatted = formatter(chat)
+            formatted_at = clock()
+            encoded = encode_json(formatted)
+            formatting += formatted_at - start
+            encoding += clock() - formatted_at
+        except Exception as e:
+            logger.error(f"Error formatting individual chat: {e}")
+            # Skip this chat if it can't be formatted
+            continue
+        yield encoded if count == 0 else "," + encoded
+        count += 1
+    # Streamed after the headers went out, so these only reach /api/metrics
+    metrics.record("format", formatting)
+    metrics.record("encode", encoding)
+    logger.info(f"Returned {count} formatted chats")
+    if envelope is None:
+        yield "]\n"
+    else:
+        yield "]," + encode_json(envelope)[1:] + "\n"
+
 @app.route('/api/chat/<session_id>', methods=['GET'])
+@conditional(chat_sources)
 def get_chat(session_id):
-    """Get a specific chat session by ID."""
+    """
+    Get a specific chat session by ID.
+
+    With `?since=<message index or version>` only the messages appended or
+    changed after that point are returned, starting at `since_index`;
+    `version` is the token to pass on the next call.
+    """
     try:
         logger.info(f"Received request for chat {session_id} from {request.remote_addr}")
-        chats = extract_chats()
-        
-        for chat in chats:
-            # Check for a matching composerId safely
-            if 'session' in chat and chat['session'] and isinstance(chat['session'], dict):
-                if chat['session'].get('composerId') == session_id:
-                    formatted_chat = format_chat_for_frontend(chat)
-                    return jsonify(formatted_chat)
-        
-        logger.warning(f"Chat with ID {session_id} not found")
-        return jsonify({"error": "Chat not found"}), 404
+        store = session_store()
+        chat = store.get(session_id)
+        if chat is None:
+            logger.warning(f"Chat with ID {session_id} not found")
+            return jsonify({"error": "Chat not found"}), 404
+
+        chain = store.message_chain(chat)
+        since = request.args.get('since')
+        if since is None:
+            with metrics.timed("format"):
+                formatted = format_chat_for_frontend(chat)
+            formatted["version"] = message_version(chain)
+            with metrics.timed("encode"):
+                return jsonify(formatted)
+
+        try:
+            start, reset = delta_start(chain, since)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        # Format the header without the messages that are not being sent
+        with metrics.timed("format"):
+            formatted = format_chat_for_frontend({**chat, "messages": chat["messages"][start:]})
+        formatted.update({
+            "since_index": start,
+            "reset": reset,
+            "version": message_version(chain),
+            "message_count": len(chain),
+        })
+        with metrics.timed("encode"):
+            return jsonify(formatted)
     except Exception as e:
+        if sqlite_pool.is_contention(e):
+            return busy_response(e)
         logger.error(f"Error in get_chat: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+# Result limits for /api/search
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 200
+
+@app.route('/api/search', methods=['GET'])
+def search_chats():
+    """
+    Full-text search over all chat messages.
+
+    Query parameters: q (required), project, role (user/assistant), since and
+    until (ms, seconds or ISO-8601), limit. since/until filter on the
+    session's last update time (`last_updated` in each hit), not on when
+    the matching message itself was written.
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "q parameter is required"}), 400
+        try:
+            limit = min(max(int(request.args.get('limit', DEFAULT_SEARCH_LIMIT)), 1), MAX_SEARCH_LIMIT)
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        bounds = {}
+        for name in ('since', 'until'):
+            raw = request.args.get(name)
+            bounds[name] = normalize_timestamp(raw) if raw is not None else None
+            if raw is not None and bounds[name] is None:
+                return jsonify({"error": f"{name} must be a timestamp in ms, seconds or ISO-8601"}), 400
+        since, until = bounds['since'], bounds['until']
+
+        start = time.perf_counter()
+        index = search_index()
+        index.sync(session_store())
+        results = index.search(query, project=request.args.get('project'), role=request.args.get('role'),
+                               since=since, until=until, limit=limit)
+        took_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Search for {query!r} returned {len(results)} results in {took_ms:.1f}ms")
+        return jsonify({"query": query, "results": results, "took_ms": round(took_ms, 2)})
+    except Exception as e:
+        if sqlite_pool.is_contention(e):
+            return busy_response(e)
+        logger.error(f"Error in search_chats: {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """
+    Server-sent event stream of storage changes.
+
+    Emits session_added / session_updated / sidebar_toggled as Cursor writes
+    its databases; `?workspace_id=` limits the stream to one workspace.
+    """
+    workspace_id = request.args.get('workspace_id')
+    watcher = storage_watcher()
+    events = watcher.subscribe()
+    logger.info(f"Event stream opened by {request.remote_addr} (workspace: {workspace_id or 'all'})")
+
+    def generate():
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    event = events.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if workspace_id and event["data"].get("workspace_id") != workspace_id:
+                    continue
+                yield sse_format(event["type"], event["data"])
+        finally:
+            watcher.unsubscribe(events)
+            logger.info("Event stream closed")
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Seconds between checks of the global DB while a chat is being streamed
+CHAT_STREAM_INTERVAL = float(os.environ.get("CURSOR_LIVE_STREAM_INTERVAL", "0.2"))
+
+@app.route('/api/chat/<session_id>/stream', methods=['GET'])
+def stream_chat(session_id):
+    """
+    Server-sent stream of one conversation's messages.
+
+    Starts with a `snapshot` event (skip with `?snapshot=0`), then pushes a
+    `message` event for each new bubble and `message_updated` when a bubble
+    is rewritten (e.g. while a reply is generated). Only this composer's
+    bubble keys written since the last check are read.
+    """
+    root = cursor_root()
+    global_db = global_storage_path(root)
+    send_snapshot = request.args.get('snapshot', '1').lower() not in ('0', 'false', 'no')
+    prefix = f"bubbleId:{session_id}:"
+
+    def read_bubbles():
+        return max_rowid(global_db), sorted(iter_disk_kv(global_db, prefix, rowids=True))
+
+    try:
+        rowid, rows = sqlite_pool.with_retry(read_bubbles) if global_db else (0, [])
+        bubbles: Dict[str, tuple[str, str]] = {}
+        for _, k, v in rows:
+            message = bubble_message(k, v)
+            if message is not None:
+                _, bubble_id, role, text = message
+                bubbles[bubble_id] = (role, text)
+        if not bubbles and session_store().get(session_id) is None:
+            return jsonify({"error": "Chat not found"}), 404
+    except sqlite3.OperationalError as e:
+        if not sqlite_pool.is_contention(e):
+            raise
+        return busy_response(e)
+    logger.info(f"Chat stream opened for {session_id} by {request.remote_addr}")
+
+    def generate():
+        nonlocal rowid
+        yield "retry: 1000\n\n"
+        if send_snapshot:
+            if bubbles:
+                messages = [{"bubble_id": bid, "role": role, "content": text}
+                            for bid, (role, text) in bubbles.items()]
+            else:
+                # Legacy chats without cursorDiskKV bubbles
+                chat = session_store().get(session_id) or {"messages": []}
+                messages = chat["messages"]
+            yield sse_format("snapshot", {"session_id": session_id, "messages": messages,
+                                          "message_count": len(messages)})
+        if global_db is None:
+            return
+
+        fingerprint = db_fingerprint(global_db)
+        idle_since = time.monotonic()
+        try:
+            while True:
+                time.sleep(CHAT_STREAM_INTERVAL)
+                current = db_fingerprint(global_db)
+                if current == fingerprint:
+                    if time.monotonic() - idle_since >= SSE_KEEPALIVE:
+                        idle_since = time.monotonic()
+                        yield ": keep-alive\n\n"
+                    continue
+                try:
+                    rows = sqlite_pool.with_retry(
+                        lambda: list(iter_disk_kv_since(global_db, rowid, values=True, prefix=prefix)))
+                except sqlite3.OperationalError as e:
+                    if not sqlite_pool.is_contention(e):
+                        raise
+                    # Still locked: read the same rows on the next check
+                    continue
+                fingerprint = current
+                for row_id, k, v in rows:
+                    rowid = max(rowid, row_id)
+                    message = bubble_message(k, v)
+                    if message is None:
+                        continue
+                    _, bubble_id, role, text = message
+                    previous = bubbles.get(bubble_id)
+                    if previous == (role, text):
+                        continue
+                    bubbles[bubble_id] = (role, text)
+                    idle_since = time.monotonic()
+                    yield sse_format("message_updated" if previous else "message",
+                                     {"session_id": session_id, "bubble_id": bubble_id,
+                                      "role": role, "content": text})
+        finally:
+            logger.info(f"Chat stream closed for {session_id}")
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/api/server/info', methods=['GET'])
 def get_server_info():
     """获取服务器信息"""
@@ -1103,7 +3712,7 @@ def get_cursor_status():
                     # 连接数据库并查询侧边栏状态
                     con = None
                     try:
-                        con = sqlite3.connect(f"file:{workspace_db}?mode=ro", uri=True)
+                        con = sqlite_pool.connect(workspace_db)
                         cur = con.cursor()
                         
                         # 查询workbench.auxiliaryBar.hidden的值
@@ -1239,7 +3848,11 @@ def get_cursor_status_simple():
 
 @app.route('/api/cursor/open', methods=['POST'])
 def open_cursor():
-    """打开Cursor应用"""
+    """打开Cursor应用（在自动化任务队列中执行，见 job_response）"""
+    return job_response("cursor_open", run_open_cursor)
+
+def run_open_cursor():
+    """打开Cursor应用，返回 (响应数据, 状态码)"""
     try:
         # 导入cursor自动化模块
         import sys
@@ -1256,23 +3869,23 @@ def open_cursor():
         success = automation.open_cursor()
         
         if success:
-            return jsonify({
+            return {
                 "success": True,
                 "message": "Cursor应用已成功打开"
-            })
+            }, 200
         else:
-            return jsonify({
+            return {
                 "success": False,
                 "message": "打开Cursor应用失败"
-            }), 500
+            }, 500
         
     except Exception as e:
         logger.error(f"Error in open_cursor: {e}", exc_info=True)
-        return jsonify({
+        return {
             "success": False,
             "error": str(e),
             "message": "打开Cursor应用时发生错误"
-        }), 500
+        }, 500
 
 @app.route('/api/cursor/activate', methods=['POST'])
 def activate_cursor():
@@ -1313,7 +3926,11 @@ def activate_cursor():
 
 @app.route('/api/cursor/quit', methods=['POST'])
 def quit_cursor():
-    """退出Cursor应用"""
+    """退出Cursor应用（在自动化任务队列中执行，见 job_response）"""
+    return job_response("cursor_quit", run_quit_cursor)
+
+def run_quit_cursor():
+    """退出Cursor应用，返回 (响应数据, 状态码)"""
     try:
         import subprocess
         import platform
@@ -1330,10 +3947,10 @@ def quit_cursor():
             result = subprocess.run(['osascript', '-e', script], 
                                    capture_output=True, text=True)
             if result.returncode == 0:
-                return jsonify({
+                return {
                     "success": True,
                     "message": "Cursor应用已成功退出"
-                })
+                }, 200
             else:
                 # 如果Bundle ID失败，尝试使用进程名
                 script_fallback = '''
@@ -1344,15 +3961,15 @@ def quit_cursor():
                 result = subprocess.run(['osascript', '-e', script_fallback], 
                                        capture_output=True, text=True)
                 if result.returncode == 0:
-                    return jsonify({
+                    return {
                         "success": True,
                         "message": "Cursor应用已成功退出"
-                    })
+                    }, 200
                 else:
-                    return jsonify({
+                    return {
                         "success": False,
                         "message": "退出Cursor应用失败"
-                    }), 500
+                    }, 500
         else:
             # Windows/Linux: 使用taskkill或pkill
             if system == 'Windows':
@@ -1360,18 +3977,18 @@ def quit_cursor():
             else:
                 subprocess.run(['pkill', '-f', 'cursor'], check=True)
             
-            return jsonify({
+            return {
                 "success": True,
                 "message": "Cursor应用已成功退出"
-            })
+            }, 200
         
     except Exception as e:
         logger.error(f"Error in quit_cursor: {e}", exc_info=True)
-        return jsonify({
+        return {
             "success": False,
             "error": str(e),
             "message": "退出Cursor应用时发生错误"
-        }), 500
+        }, 500
 
 
 @app.route('/api/cursor/dialog/close', methods=['POST'])
@@ -1467,7 +4084,7 @@ def get_sidebar_status():
         # 连接数据库并查询侧边栏状态
         con = None
         try:
-            con = sqlite3.connect(f"file:{workspace_db}?mode=ro", uri=True)
+            con = sqlite_pool.connect(workspace_db)
             cur = con.cursor()
             
             # 查询workbench.auxiliaryBar.hidden的值
@@ -1490,10 +4107,13 @@ def get_sidebar_status():
                 con.close()
                 
     except Exception as e:
+        if sqlite_pool.is_contention(e):
+            return busy_response(e)
         logger.error(f"Error checking sidebar status: {e}")
         return jsonify({"error": f"Failed to check sidebar status: {str(e)}"}), 500
 
 @app.route('/api/workspace/<workspace_id>/info', methods=['GET'])
+@conditional(workspace_sources)
 def get_workspace_info(workspace_id):
     """获取工作空间信息"""
     try:
@@ -1525,12 +4145,27 @@ def get_workspace_info(workspace_id):
         })
         
     except Exception as e:
+        if sqlite_pool.is_contention(e):
+            return busy_response(e)
         logger.error(f"Error getting workspace info: {e}")
         return jsonify({"error": f"Failed to get workspace info: {str(e)}"}), 500
 
 
 
 
+def automation_module():
+    """加载pyautogu自动化模块，不可用时返回None"""
+    # 添加当前目录到Python路径
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    if current_dir not in sys.path:
+        sys.path.insert(0, current_dir)
+    try:
+        import pyautogu
+    except ImportError as e:
+        logger.error(f"pyautogu module not available: {e}")
+        return None
+    return pyautogu
+
 @app.route('/api/create-new-chat', methods=['POST'])
 def create_new_chat():
     """创建新对话 - 重启&激活Cursor，开启AI对话栏，新增对话"""
@@ -1552,50 +4187,53 @@ def create_new_chat():
         logger.info(f"Current workspace ID: {current_workspace_id}")
 
         # 检查pyautogui模块是否可用
-        try:
-            import sys
-            import os
-
-            # 添加当前目录到Python路径
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            if current_dir not in sys.path:
-                sys.path.insert(0, current_dir)
-            from pyautogu import create_new_chat_in_cursor
-            from pyautogu import switch_cursor_project
-        except ImportError as e:
-            logger.error(f"pyautogu module not available: {e}")
+        if automation_module() is None:
             return jsonify({"error": "Cursor automation not available. Please ensure pyautogu.py is properly configured."}), 500
+
+        # 切换项目和新建对话耗时较长，交给自动化任务队列执行
+        return job_response("create_new_chat", run_create_new_chat, workspace_id, root_path)
+
+    except Exception as e:
+        logger.error(f"Error in create_new_chat: {e}", exc_info=True)
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+def run_create_new_chat(workspace_id, root_path):
+    """切换到目标项目并新建对话，返回 (响应数据, 状态码)"""
+    try:
+        pyautogu = automation_module()
+        if pyautogu is None:
+            return {"error": "Cursor automation not available. Please ensure pyautogu.py is properly configured."}, 500
+
         # 如果有rootPath，则切换到目标项目
         if root_path:
             logger.info(f"Switching to project: {root_path}")
-            switch_success = switch_cursor_project(root_path)
+            switch_success = pyautogu.switch_cursor_project(root_path)
             if not switch_success:
                 logger.error(f"Failed to switch to project: {root_path}")
-                return jsonify({"error": f"Failed to switch to project: {root_path}"}), 500
+                return {"error": f"Failed to switch to project: {root_path}"}, 500
 
             logger.info(f"Successfully switched to workspace: {workspace_id}")
-            project_switched = True
         else:
             logger.warning("Workspace ID provided but no rootPath available for switching")
 
 
         # 调用pyautogui创建新对话
-        success = create_new_chat_in_cursor(workspace_id=workspace_id)
+        success = pyautogu.create_new_chat_in_cursor(workspace_id=workspace_id)
 
         if success:
             logger.info("New chat successfully created in Cursor")
-            return jsonify({
+            return {
                 "success": True,
                 "message": "New chat created successfully",
                 "workspace_id": workspace_id
-            })
+            }, 200
         else:
             logger.error("Failed to create new chat in Cursor")
-            return jsonify({"error": "Failed to create new chat. Please ensure Cursor is running and accessible."}), 500
+            return {"error": "Failed to create new chat. Please ensure Cursor is running and accessible."}, 500
 
     except Exception as e:
         logger.error(f"Error in create_new_chat: {e}", exc_info=True)
-        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+        return {"error": f"Internal server error: {str(e)}"}, 500
 
 
 @app.route('/api/send-message', methods=['POST'])
@@ -1623,84 +4261,103 @@ def send_message():
         logger.info(f"Workspace ID: {workspace_id}, Session ID: {session_id}")
 
         # 检查pyautogui模块是否可用
-        try:
-            import sys
-            import os
-
-            # 添加当前目录到Python路径
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            if current_dir not in sys.path:
-                sys.path.insert(0, current_dir)
-            from pyautogu import send_message_to_cursor
-        except ImportError as e:
-            logger.error(f"pyautogu module not available: {e}")
+        if automation_module() is None:
             return jsonify({"error": "Cursor automation not available. Please ensure pyautogu.py is properly configured."}), 500
 
-        # 发送消息到Cursor
-        try:
-            result = send_message_to_cursor(message, workspace_id)
-            if result:
-                success, response_session_id = True, session_id
-            else:
-                success, response_session_id = False, session_id
-        except Exception as e:
-            logger.error(f"Failed to send message to Cursor: {e}")
-            return jsonify({"error": f"Failed to send message: {str(e)}"}), 500
-
-        if success:
-            # 如果前端没有提供session_id，需要轮询最新的session
-            if not session_id and workspace_id:
-                logger.info("No session_id provided, polling for latest session...")
-
-                # 轮询获取最新的session_id和内容
-                max_polls = 30  # 最多轮询30次
-                poll_interval = 1  # 每次间隔1秒
+        # 输入消息并等待会话写入可能耗时数秒，交给自动化任务队列执行
+        return job_response("send_message", run_send_message, message, workspace_id, session_id)
 
-                for i in range(max_polls):
-                    logger.debug(f"Polling attempt {i + 1}/{max_polls}")
+    except Exception as e:
+        logger.error(f"Error in send_message: {e}", exc_info=True)
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
-                    # 获取最新的session信息
-                    latest_session = get_latest_session_id(workspace_id)
+def run_send_message(message, workspace_id, session_id):
+    """
+    输入消息到Cursor，返回 (响应数据, 状态码)
 
-                    if latest_session:
-                        latest_messages = latest_session.get('messages', [])
+    需要确定所属会话时还返回一个后续函数：它只轮询数据库，不操作界面，
+    由任务队列在单独线程执行，不阻塞排在后面的自动化任务。
+    """
+    try:
+        pyautogu = automation_module()
+        if pyautogu is None:
+            return {"error": "Cursor automation not available. Please ensure pyautogu.py is properly configured."}, 500
 
-                        # 检查是否有匹配的用户消息
-                        for msg in latest_messages:
-                            if msg.get('role') == 'user' and msg.get('content', '').strip() == message:
-                                response_session_id = latest_session['session_id']
-                                logger.info(f"Found matching session: {response_session_id}")
-                                break
+        # 发送前记录全局数据库的rowid水位，之后只需检查新写入的记录
+        global_db = global_storage_path(cursor_root())
+        since_rowid = sqlite_pool.with_retry(max_rowid, global_db) if global_db else 0
 
-                        if response_session_id:
-                            break
+        # 发送消息到Cursor
+        try:
+            success = bool(pyautogu.send_message_to_cursor(message, workspace_id))
+        except Exception as e:
+            logger.error(f"Failed to send message to Cursor: {e}")
+            return {"error": f"Failed to send message: {str(e)}"}, 500
 
-                    # 等待一秒后继续轮询
-                    import time
-                    time.sleep(poll_interval)
+        if not success:
+            logger.error("Failed to send message to Cursor")
+            return {"error": "Failed to send message to Cursor"}, 500
 
-                if not response_session_id:
-                    logger.warning("Could not find matching session after polling")
+        logger.info("Message successfully sent to Cursor")
+        response_data = {
+            "success": True,
+            "message": "Message sent to Cursor successfully"
+        }
+        if session_id or not workspace_id:
+            if session_id:
+                response_data["session_id"] = session_id
+                logger.info(f"Session ID: {session_id}")
+            return response_data, 200
 
-            logger.info("Message successfully sent to Cursor")
-            response_data = {
-                "success": True,
-                "message": "Message sent to Cursor successfully"
-            }
+        def resolve_session():
+            # 前端没有提供session_id：等待Cursor写入这条用户消息来确定会话
+            if global_db:
+                logger.info("No session_id provided, waiting for the message to be written...")
+                response_session_id = wait_for_sent_message(global_db, message, since_rowid)
+            else:
+                # 没有全局数据库（旧版本Cursor），退回到轮询最新会话
+                logger.info("No session_id provided, polling for latest session...")
+                response_session_id = None
+                deadline = time.monotonic() + SEND_MATCH_TIMEOUT
+                while not response_session_id and time.monotonic() < deadline:
+                    latest_session = get_latest_session_id(workspace_id)
+                    if latest_session and any(
+                            msg.get('role') == 'user' and msg.get('content', '').strip() == message
+                            for msg in latest_session.get('messages', [])):
+                        response_session_id = latest_session['session_id']
+                    else:
+                        time.sleep(1)
 
             if response_session_id:
+                logger.info(f"Found matching session: {response_session_id}")
                 response_data["session_id"] = response_session_id
-                logger.info(f"Session ID: {response_session_id}")
+            else:
+                logger.warning("Could not find matching session after polling")
+            return response_data, 200
 
-            return jsonify(response_data)
-        else:
-            logger.error("Failed to send message to Cursor")
-            return jsonify({"error": "Failed to send message to Cursor"}), 500
+        return response_data, 200, resolve_session
 
     except Exception as e:
         logger.error(f"Error in send_message: {e}", exc_info=True)
-        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+        return {"error": f"Internal server error: {str(e)}"}, 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    查询自动化任务的状态和结果
 
+    `?wait=N` 最多等待N秒直到任务完成；任务的 `result` / `status_code`
+    即同步调用时接口会返回的内容。
+    """
+    jobs = job_queue()
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    wait = requested_wait()
+    if wait and not job.done:
+        jobs.wait(job, wait)
+    return jsonify(job.to_dict())
 
 @app.route('/api/send-to-cursor', methods=['POST'])
 def send_to_cursor():
@@ -1709,6 +4366,7 @@ def send_to_cursor():
     return jsonify({"error": "This endpoint is deprecated. Please use /api/create-new-chat and /api/send-message instead."}), 410
 
 @app.route('/api/latest-session', methods=['GET'])
+@conditional(latest_session_sources)
 def get_latest_session_api():
     """获取指定工作空间的最新会话ID"""
     try:
@@ -1728,6 +4386,8 @@ def get_latest_session_api():
             return jsonify({"error": "No sessions found"}), 404
             
     except Exception as e:
+        if sqlite_pool.is_contention(e):
+            return busy_response(e)
         logger.error(f"Error getting latest session: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
@@ -1737,40 +4397,38 @@ def export_chat(session_id):
     try:
         logger.info(f"Received request to export chat {session_id} from {request.remote_addr}")
         export_format = request.args.get('format', 'html').lower()
-        chats = extract_chats()
-        
-        for chat in chats:
-            # Check for a matching composerId safely
-            if 'session' in chat and chat['session'] and isinstance(chat['session'], dict):
-                if chat['session'].get('composerId') == session_id:
-                    formatted_chat = format_chat_for_frontend(chat)
-                    
-                    if export_format == 'json':
-                        # Export as JSON
-                        return Response(
-                            json.dumps(formatted_chat, indent=2),
-                            mimetype="application/json; charset=utf-8",
-                            headers={
-                                "Content-Disposition": f'attachment; filename="cursor-chat-{session_id[:8]}.json"',
-                                "Cache-Control": "no-store",
-                            },
-                        )
-                    else:
-                        # Default to HTML export
-                        html_content = generate_standalone_html(formatted_chat)
-                        return Response(
-                            html_content,
-                            mimetype="text/html; charset=utf-8",
-                            headers={
-                                "Content-Disposition": f'attachment; filename="cursor-chat-{session_id[:8]}.html"',
-                                "Content-Length": str(len(html_content)),
-                                "Cache-Control": "no-store",
-                            },
-                        )
-        
-        logger.warning(f"Chat with ID {session_id} not found for export")
-        return jsonify({"error": "Chat not found"}), 404
+        chat = session_store().get(session_id)
+        if chat is None:
+            logger.warning(f"Chat with ID {session_id} not found for export")
+            return jsonify({"error": "Chat not found"}), 404
+
+        formatted_chat = format_chat_for_frontend(chat)
+
+        if export_format == 'json':
+            # Export as JSON
+            return Response(
+                json.dumps(formatted_chat, indent=2, default=to_json_value),
+                mimetype="application/json; charset=utf-8",
+                headers={
+                    "Content-Disposition": f'attachment; filename="cursor-chat-{session_id[:8]}.json"',
+                    "Cache-Control": "no-store",
+                },
+            )
+        else:
+            # Default to HTML export
+            html_content = generate_standalone_html(formatted_chat)
+            return Response(
+                html_content,
+                mimetype="text/html; charset=utf-8",
+                headers={
+                    "Content-Disposition": f'attachment; filename="cursor-chat-{session_id[:8]}.html"',
+                    "Content-Length": str(len(html_content)),
+                    "Cache-Control": "no-store",
+                },
+            )
     except Exception as e:
+        if sqlite_pool.is_contention(e):
+            return busy_response(e)
         logger.error(f"Error in export_chat: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
@@ -1950,7 +4608,10 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Run the Cursor Chat View server')
     parser.add_argument('--port', type=int, default=5004, help='Port to run the server on')
     parser.add_argument('--debug', action='store_true', help='Run in debug mode')
+    parser.add_argument('--scan-workers', type=int, default=SCAN_WORKERS,
+                        help='Number of Cursor databases to scan concurrently')
     args = parser.parse_args()
+    SCAN_WORKERS = max(1, args.scan_workers)
     
     logger.info(f"Starting server on port {args.port}")
     
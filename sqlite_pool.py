@@ -0,0 +1,290 @@
+"""
+Pooled read-only connections to Cursor's state.vscdb files.
+
+Opening a connection re-reads the schema and sets up the page cache, which
+dominates cheap reads such as status polls. connect() hands out a connection
+from a per-path pool instead; closing it puts it back. Connections are opened
+with `mode=ro`, `query_only`, a memory-mapped I/O window and a larger page
+cache, and are reopened when the file on disk is replaced.
+
+Cursor writes these files while we read them. Connections wait up to
+BUSY_TIMEOUT_MS on its locks, with_retry() backs off and retries reads that
+still hit contention, and snapshot() lets a bulk scan read one consistent
+copy of a database instead of the live file.
+"""
+import contextlib
+import logging
+import os
+import pathlib
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Union
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bytes of the database file SQLite may memory-map (0 disables mmap)
+MMAP_SIZE = int(os.environ.get("CURSOR_LIVE_SQLITE_MMAP", str(256 * 1024 * 1024)))
+# Page cache per connection in KiB
+CACHE_SIZE_KIB = int(os.environ.get("CURSOR_LIVE_SQLITE_CACHE_KIB", "16384"))
+# Idle connections kept per database path
+MAX_IDLE_PER_DB = 4
+# Milliseconds a read waits on a lock held by Cursor before failing
+BUSY_TIMEOUT_MS = int(os.environ.get("CURSOR_LIVE_SQLITE_BUSY_MS", "2000"))
+# Attempts, and the first backoff delay in seconds, for reads that still hit contention
+RETRY_ATTEMPTS = int(os.environ.get("CURSOR_LIVE_SQLITE_RETRIES", "4"))
+RETRY_BACKOFF = 0.05
+# How snapshot() copies a database: "off", "memory" (backup API into an
+# in-memory DB) or "file" (backup into an immutable copy on tmpfs)
+SNAPSHOT_MODE = os.environ.get("CURSOR_LIVE_SNAPSHOT", "off").lower()
+
+RETRIES = metrics.counter("cursor_live_sqlite_retries_total", "Reads retried after hitting lock contention")
+
+
+def file_identity(path: str) -> Optional[tuple[int, int]]:
+    """(st_dev, st_ino) of a file, None if it is gone; changes when the file is replaced."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def is_contention(e: BaseException) -> bool:
+    """True for SQLITE_BUSY / SQLITE_LOCKED errors, i.e. a writer held the lock too long."""
+    if not isinstance(e, sqlite3.OperationalError):
+        return False
+    code = getattr(e, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (getattr(sqlite3, "SQLITE_BUSY", 5), getattr(sqlite3, "SQLITE_LOCKED", 6))
+    message = str(e).lower()
+    return "locked" in message or "busy" in message
+
+
+def with_retry(fn, *args, attempts: Optional[int] = None, backoff: float = RETRY_BACKOFF):
+    """Call fn(*args), retrying with jittered exponential backoff while it fails on lock contention."""
+    attempts = max(1, attempts or RETRY_ATTEMPTS)
+    for attempt in range(attempts):
+        try:
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            if not is_contention(e) or attempt == attempts - 1:
+                raise
+            delay = backoff * (2 ** attempt) * (1 + random.random())
+            RETRIES.inc()
+            logger.debug(f"Database busy ({e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+class PooledConnection:
+    """
+    A read-only connection checked out of a ConnectionPool.
+
+    Behaves like sqlite3.Connection for reads. close() finishes every cursor
+    opened through it (so no read snapshot outlives the caller) and hands the
+    connection to `release`, which returns it to the pool.
+    """
+
+    def __init__(self, con: sqlite3.Connection, release):
+        self._con: Optional[sqlite3.Connection] = con
+        self._release = release
+        self._cursors: list[sqlite3.Cursor] = []
+
+    def cursor(self) -> sqlite3.Cursor:
+        cur = self._connection().cursor()
+        self._cursors.append(cur)
+        return cur
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        cur = self.cursor()
+        cur.execute(sql, params)
+        return cur
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._con is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return self._con
+
+    def __getattr__(self, name):
+        return getattr(self._connection(), name)
+
+    def close(self):
+        con, self._con = self._con, None
+        if con is None:
+            return
+        cursors, self._cursors = self._cursors, []
+        try:
+            for cur in cursors:
+                cur.close()
+        except sqlite3.Error:
+            con.close()
+            return
+        self._release(con)
+
+    def __enter__(self) -> "PooledConnection":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Per-path pools of read-only SQLite connections, safe to share between threads."""
+
+    def __init__(self, max_idle: int = MAX_IDLE_PER_DB):
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: Dict[str, list[tuple[sqlite3.Connection, tuple[int, int]]]] = {}
+
+    def connect(self, db: Union[str, pathlib.Path]) -> PooledConnection:
+        path = str(db)
+        snapshot_con = _snapshot_connection(path)
+        if snapshot_con is not None:
+            return snapshot_con
+        identity = file_identity(path)
+        with self._lock:
+            idle = self._idle.get(path, [])
+            # Connections to a file that has since been replaced are stale
+            stale = [con for con, ident in idle if ident != identity]
+            idle[:] = [(con, ident) for con, ident in idle if ident == identity]
+            con = idle.pop()[0] if idle else None
+        for old in stale:
+            logger.debug(f"Reopening replaced database {path}")
+            old.close()
+        metrics.cache_lookup("sqlite_pool", con is not None)
+        if con is None:
+            with metrics.timed("sqlite.open"):
+                con = self._open(path)
+        return PooledConnection(con, lambda c: self.release(path, c, identity))
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        con = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False,
+                              timeout=BUSY_TIMEOUT_MS / 1000)
+        try:
+            con.execute("PRAGMA query_only = ON")
+            con.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            con.execute(f"PRAGMA cache_size = {-CACHE_SIZE_KIB}")
+        except sqlite3.DatabaseError:
+            con.close()
+            raise
+        return con
+
+    def release(self, path: str, con: sqlite3.Connection, identity):
+        with self._lock:
+            idle = self._idle.setdefault(path, [])
+            if identity is not None and len(idle) < self.max_idle:
+                idle.append((con, identity))
+                return
+        con.close()
+
+    def clear(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for con, _ in conns:
+                con.close()
+
+
+_pool = ConnectionPool()
+
+# Snapshots taken by the current thread: path -> ("memory", connection) or ("file", copy path)
+_local = threading.local()
+
+
+def _snapshot_connection(path: str) -> Optional[PooledConnection]:
+    target = getattr(_local, "snapshots", {}).get(path)
+    if target is None:
+        return None
+    mode, value = target
+    if mode == "memory":
+        # One in-memory copy shared by this thread's sequential readers; closed with the snapshot
+        return PooledConnection(value, lambda c: None)
+    con = sqlite3.connect(f"file:{value}?immutable=1", uri=True, check_same_thread=False)
+    return PooledConnection(con, lambda c: c.close())
+
+
+def snapshot_dir() -> str:
+    """Directory for file snapshots: tmpfs when the platform has one."""
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        return shm
+    return tempfile.gettempdir()
+
+
+@contextlib.contextmanager
+def snapshot(db: Union[str, pathlib.Path], mode: Optional[str] = None):
+    """
+    Make connect(db) from this thread read one consistent copy of `db` inside the block.
+
+    The copy is taken in a single step of the backup API, so it reflects
+    one committed state even while Cursor keeps writing; readers then never
+    wait on its locks. With mode "off" the live file is read as usual.
+    """
+    mode = (mode or SNAPSHOT_MODE).lower()
+    if mode == "off":
+        yield
+        return
+    if mode not in ("memory", "file"):
+        raise ValueError(f"Unknown snapshot mode: {mode}")
+
+    path = str(db)
+    snapshots = _local.__dict__.setdefault("snapshots", {})
+    if path in snapshots:
+        # Already reading a snapshot of this DB further up the stack
+        yield
+        return
+
+    if mode == "memory":
+        dst = sqlite3.connect(":memory:", check_same_thread=False)
+        copy_path = None
+    else:
+        fd, copy_path = tempfile.mkstemp(prefix="cursor-live-", suffix=".vscdb", dir=snapshot_dir())
+        os.close(fd)
+        dst = sqlite3.connect(copy_path, check_same_thread=False)
+    try:
+        src = _pool.connect(path)
+        try:
+            with metrics.timed("sqlite.snapshot"):
+                with_retry(src.backup, dst)
+        finally:
+            src.close()
+        if copy_path is not None:
+            dst.execute("PRAGMA journal_mode = DELETE")
+            dst.close()
+    except BaseException:
+        dst.close()
+        if copy_path is not None:
+            os.unlink(copy_path)
+        raise
+
+    snapshots[path] = ("memory", dst) if copy_path is None else ("file", copy_path)
+    try:
+        yield
+    finally:
+        del snapshots[path]
+        if copy_path is None:
+            dst.close()
+        else:
+            with contextlib.suppress(OSError):
+                os.unlink(copy_path)
+
+
+def connect(db: Union[str, pathlib.Path]) -> PooledConnection:
+    """Check out a pooled read-only connection to `db`; close() returns it."""
+    return _pool.connect(db)
+
+
+def clear():
+    """Close all idle pooled connections."""
+    _pool.clear()